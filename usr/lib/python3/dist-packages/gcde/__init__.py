@@ -24,3 +24,16 @@
 """__init__ for GCDE Lib"""
 from gcde import tile as tile
 from gcde import common as common
+from gcde import icons as icons
+from gcde import desktop as desktop
+from gcde import inotify as inotify
+from gcde import applications as applications
+from gcde import search as search
+from gcde import layout as layout
+from gcde import config as config
+from gcde import control as control
+from gcde import autostart as autostart
+from gcde import writeback as writeback
+from gcde import themes as themes
+from gcde import launcher as launcher
+from gcde import profiler as profiler
@@ -0,0 +1,438 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+#  applications.py
+#
+#  Copyright 2020 Thomas Castleman <contact@draugeros.org>
+#
+#  This program is free software; you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation; either version 2 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software
+#  Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston,
+#  MA 02110-1301, USA.
+#
+#
+"""Application catalog for the GCDE Menu
+
+Parsing every .desktop file each time the Menu is opened is slow on systems
+with lots of applications installed. Instead, parsed entries are kept in an
+index on disk per applications directory, keyed on path, mtime and size, so
+at startup only entries which changed since the last run get re-parsed.
+
+After that, the Catalog watches every applications directory in
+XDG_DATA_DIRS (and the user's own) with inotify, and updates itself one
+file at a time as applications are installed or removed. Directories which
+don't exist yet (Flatpak's and Snap's, before anything is installed with
+them) are picked up as soon as they are made.
+"""
+import os
+import json
+from gi.repository import GLib
+import gcde.common as common
+import gcde.desktop as desktop
+import gcde.inotify as inotify
+
+INDEX_VERSION = 4
+
+WATCH_MASK = (inotify.IN_CLOSE_WRITE | inotify.IN_ATTRIB |
+              inotify.IN_MOVED_FROM | inotify.IN_MOVED_TO |
+              inotify.IN_CREATE | inotify.IN_DELETE |
+              inotify.IN_DELETE_SELF | inotify.IN_MOVE_SELF)
+# For the nearest existing parent of an applications directory which doesn't
+# exist yet, such as Flatpak's before the first Flatpak is installed
+PARENT_MASK = (inotify.IN_CREATE | inotify.IN_MOVED_TO |
+               inotify.IN_DELETE_SELF | inotify.IN_MOVE_SELF |
+               inotify.IN_ONLYDIR | inotify.IN_MASK_ADD)
+
+# In-memory copy of the on-disk indexes, so we don't even need to re-read the
+# JSON after the first time they are used
+_indexes = {}
+
+
+def _index_file(prefix):
+    """Get the location of the index for `prefix`"""
+    name = prefix.strip("/").replace("/", "-")
+    return os.path.join(common.get_cache_dir(), "applications-%s.json" % (name))
+
+
+def get_application_dirs():
+    """Get every applications directory, most important first
+
+    This is $XDG_DATA_HOME/applications, followed by the applications
+    directory in each of $XDG_DATA_DIRS, with duplicates removed."""
+    data_home = os.getenv("XDG_DATA_HOME")
+    if not data_home:
+        data_home = os.path.join(os.getenv("HOME"), ".local/share")
+    data_dirs = os.getenv("XDG_DATA_DIRS")
+    if not data_dirs:
+        data_dirs = "/usr/local/share:/usr/share"
+    output = []
+    for each in [data_home] + data_dirs.split(":"):
+        if not each:
+            continue
+        each = os.path.join(os.path.normpath(each), "applications") + "/"
+        if each not in output:
+            output.append(each)
+    return output
+
+
+def parse_entry(path):
+    """Parse a .desktop file into a Menu entry
+
+    Returns None if the entry should not be shown in the Menu"""
+    entry = desktop.parse(path)
+    if entry.type not in (None, "Application") or entry.terminal:
+        return None
+    if entry.name is None or not entry.exec or not entry.should_show():
+        return None
+    return {"name":entry.name, "icon":entry.icon or "", "exec":entry.exec,
+            "generic name":entry.generic_name, "keywords":list(entry.keywords)}
+
+
+def load_index(prefix):
+    """Load the index for `prefix` from memory or disk"""
+    if prefix in _indexes:
+        return _indexes[prefix]
+    try:
+        with open(_index_file(prefix), "r") as file:
+            index = json.load(file)
+        if index["version"] != INDEX_VERSION:
+            raise ValueError("Outdated application index")
+    except (FileNotFoundError, ValueError, KeyError):
+        index = {"version":INDEX_VERSION, "entries":{}}
+    _indexes[prefix] = index
+    return index
+
+
+def save_index(prefix, index):
+    """Save the index for `prefix` to disk"""
+    path = _index_file(prefix)
+    with open(path + ".tmp", "w") as file:
+        json.dump(index, file)
+    os.replace(path + ".tmp", path)
+
+
+def update_entry(prefix, name, index=None):
+    """Bring the index entry for file `name` in `prefix` up to date
+
+    Returns True if the index entry changed"""
+    if index is None:
+        index = load_index(prefix)
+    entries = index["entries"]
+    try:
+        stat = os.stat(prefix + name)
+    except OSError:
+        if name in entries:
+            del entries[name]
+            return True
+        return False
+    key = [stat.st_mtime_ns, stat.st_size]
+    if name in entries and entries[name][:2] == key:
+        return False
+    try:
+        entry = parse_entry(prefix + name)
+    except (OSError, UnicodeDecodeError, ValueError):
+        entry = None
+    entries[name] = key + [entry]
+    return True
+
+
+def scan(prefix):
+    """Get index entries for every .desktop file in `prefix` and below
+
+    Entries are keyed on their path relative to `prefix`. Only files which
+    have been added or changed since the index was last updated are
+    parsed."""
+    index = load_index(prefix)
+    entries = index["entries"]
+    seen = set()
+    changed = False
+    dirs = [""]
+    while dirs:
+        sub = dirs.pop()
+        try:
+            directory = os.scandir(prefix + sub)
+        except OSError:
+            continue
+        with directory:
+            for each in directory:
+                name = sub + each.name
+                # Symlinked directories are not followed, so a link back up
+                # the tree can't send us round in circles
+                if each.is_dir(follow_symlinks=False):
+                    dirs.append(name + "/")
+                    continue
+                if not each.name.endswith(".desktop"):
+                    continue
+                try:
+                    stat = each.stat()
+                except OSError:
+                    # Dangling symlink, or the file went away under us
+                    continue
+                seen.add(name)
+                key = [stat.st_mtime_ns, stat.st_size]
+                if name in entries and entries[name][:2] == key:
+                    continue
+                try:
+                    entry = parse_entry(each.path)
+                except (OSError, UnicodeDecodeError, ValueError):
+                    entry = None
+                entries[name] = key + [entry]
+                changed = True
+    for each in list(entries):
+        if each not in seen:
+            del entries[each]
+            changed = True
+    if changed:
+        save_index(prefix, index)
+    return entries
+
+
+def desktop_id(name):
+    """Get the desktop file ID for `name`, a path relative to its applications directory"""
+    return name.replace("/", "-")
+
+
+class Catalog():
+    """Every application installed, kept up to date with inotify
+
+    Where the same desktop file ID is in more than one applications
+    directory, only the one from the most important directory is used, as
+    the XDG Desktop Menu Specification says."""
+    def __init__(self, dirs=None):
+        """Load the catalog and start watching for changes"""
+        if dirs is None:
+            dirs = get_application_dirs()
+        self.dirs = dirs
+        self.version = 0
+        self.applications = {}
+        self.listeners = []
+        # Desktop file ID -> file, for each directory
+        self.__ids__ = {}
+        self.__watches__ = {}
+        # Parent watch descriptor -> (parent, applications directories
+        # waiting for it to get the next directory down)
+        self.__waiting__ = {}
+        self.__dirty__ = set()
+        self.__notify_source__ = None
+        self.__start_watching__()
+        for each in self.dirs:
+            self.__ids__[each] = {}
+            for name in scan(each):
+                self.__ids__[each][desktop_id(name)] = name
+        for each in self.dirs:
+            for app_id in self.__ids__[each]:
+                self.__resolve__(app_id)
+            self.__watch_root__(each)
+
+    def __start_watching__(self):
+        """Set up inotify"""
+        self.__inotify__ = inotify.Inotify(self.__events_ready__)
+        if not self.__inotify__.available:
+            common.eprint("WARNING: inotify unavailable, application catalog will not update live")
+
+    def __watch_root__(self, prefix):
+        """Watch applications directory `prefix`, or wait for it to be made
+
+        If `prefix` doesn't exist, its nearest existing parent is watched
+        instead, until the next directory down appears. Returns True if
+        `prefix` itself is now being watched."""
+        if not self.__inotify__.available:
+            return False
+        while not os.path.isdir(prefix):
+            parent = os.path.dirname(prefix.rstrip("/"))
+            below = prefix
+            while not os.path.isdir(parent) and parent != os.path.dirname(parent):
+                below = parent
+                parent = os.path.dirname(parent)
+            wd = self.__inotify__.add_watch(parent, PARENT_MASK)
+            if wd < 0:
+                return False
+            if not os.path.isdir(below):
+                parent = os.path.join(parent, "")
+                self.__waiting__.setdefault(wd, (parent, set()))[1].add(prefix)
+                return False
+            # The next directory down was made before the watch was in place
+            if (wd not in self.__waiting__) and (wd not in self.__watches__):
+                self.__inotify__.rm_watch(wd)
+        return self.__watch_tree__(prefix, "")
+
+    def __parent_event__(self, wd, mask, name):
+        """Handle an event on a parent of applications directories which don't exist yet"""
+        parent, waiting = self.__waiting__[wd]
+        if mask & (inotify.IN_DELETE_SELF | inotify.IN_MOVE_SELF |
+                   inotify.IN_IGNORED):
+            # Wait on whichever parent still exists instead
+            del self.__waiting__[wd]
+            for each in waiting:
+                self.__watch_root__(each)
+            return
+        if not (mask & inotify.IN_ISDIR and
+                mask & (inotify.IN_CREATE | inotify.IN_MOVED_TO)):
+            return
+        for each in list(waiting):
+            if each.startswith(parent + name + "/"):
+                waiting.discard(each)
+                if self.__watch_root__(each):
+                    self.__rescan_dir__(each)
+                    self.__changed__(each)
+        if not waiting:
+            del self.__waiting__[wd]
+            if wd not in self.__watches__:
+                self.__inotify__.rm_watch(wd)
+
+    def __watch_tree__(self, prefix, sub):
+        """Watch directory `sub` of `prefix`, and every directory below it
+
+        Returns True if `sub` itself could be watched."""
+        if not self.__inotify__.available:
+            return False
+        path = prefix + sub
+        wd = self.__inotify__.add_watch(path, WATCH_MASK)
+        if wd < 0:
+            return False
+        self.__watches__[wd] = (prefix, sub)
+        try:
+            directory = os.scandir(path)
+        except OSError:
+            return True
+        with directory:
+            for each in directory:
+                if each.is_dir(follow_symlinks=False):
+                    self.__watch_tree__(prefix, sub + each.name + "/")
+        return True
+
+    def __resolve__(self, app_id):
+        """Work out which directory's copy of `app_id` is in use"""
+        for each in self.dirs:
+            if app_id not in self.__ids__[each]:
+                continue
+            entries = load_index(each)["entries"]
+            name = self.__ids__[each][app_id]
+            if entries[name][2] is None:
+                # Hidden entries hide copies in less important directories
+                self.applications.pop(app_id, None)
+            else:
+                self.applications[app_id] = entries[name][2]
+            return
+        self.applications.pop(app_id, None)
+
+    def __events_ready__(self, events):
+        """Apply inotify events"""
+        for wd, mask, name in events:
+            if mask & inotify.IN_Q_OVERFLOW:
+                # Events were lost, so there is no choice but to re-scan
+                self.__rescan__()
+                continue
+            if wd in self.__waiting__:
+                self.__parent_event__(wd, mask, name)
+            if wd not in self.__watches__:
+                continue
+            prefix, sub = self.__watches__[wd]
+            if mask & (inotify.IN_DELETE_SELF | inotify.IN_MOVE_SELF |
+                       inotify.IN_IGNORED):
+                del self.__watches__[wd]
+                self.__forget__(prefix, sub)
+                if sub == "":
+                    # Pick the directory up again if it is made again
+                    if mask & inotify.IN_MOVE_SELF:
+                        self.__inotify__.rm_watch(wd)
+                    if self.__watch_root__(prefix):
+                        self.__rescan_dir__(prefix)
+                        self.__changed__(prefix)
+                continue
+            if mask & inotify.IN_ISDIR:
+                if mask & (inotify.IN_CREATE | inotify.IN_MOVED_TO):
+                    self.__watch_tree__(prefix, sub + name + "/")
+                    for each in scan(prefix):
+                        if each.startswith(sub + name + "/"):
+                            self.__ids__[prefix][desktop_id(each)] = each
+                            self.__resolve__(desktop_id(each))
+                    self.__changed__(prefix)
+                elif mask & inotify.IN_MOVED_FROM:
+                    self.__forget__(prefix, sub + name + "/")
+                continue
+            if not name.endswith(".desktop"):
+                continue
+            if update_entry(prefix, sub + name):
+                app_id = desktop_id(sub + name)
+                if sub + name in load_index(prefix)["entries"]:
+                    self.__ids__[prefix][app_id] = sub + name
+                else:
+                    self.__ids__[prefix].pop(app_id, None)
+                self.__resolve__(app_id)
+                self.__changed__(prefix)
+
+    def __rescan__(self):
+        """Re-scan every applications directory"""
+        for each in self.dirs:
+            self.__rescan_dir__(each)
+        self.__changed__()
+
+    def __rescan_dir__(self, prefix):
+        """Re-scan applications directory `prefix`"""
+        old = self.__ids__[prefix]
+        self.__ids__[prefix] = {}
+        for name in scan(prefix):
+            self.__ids__[prefix][desktop_id(name)] = name
+        for app_id in set(old) | set(self.__ids__[prefix]):
+            self.__resolve__(app_id)
+
+    def __forget__(self, prefix, sub):
+        """Drop entries for directory `sub` of `prefix`, which has gone away"""
+        entries = load_index(prefix)["entries"]
+        for each in list(entries):
+            if each.startswith(sub):
+                del entries[each]
+                self.__ids__[prefix].pop(desktop_id(each), None)
+                self.__resolve__(desktop_id(each))
+        self.__changed__(prefix)
+
+    def __changed__(self, prefix=None):
+        """Note that the catalog changed, telling listeners shortly after
+
+        Installing a package usually touches several files at once, so
+        changes are batched up."""
+        self.version += 1
+        if prefix is not None:
+            self.__dirty__.add(prefix)
+        if self.__notify_source__ is None:
+            self.__notify_source__ = GLib.timeout_add(250, self.__notify__)
+
+    def __notify__(self):
+        """Save changed indexes and tell listeners about changes"""
+        self.__notify_source__ = None
+        for each in self.__dirty__:
+            save_index(each, load_index(each))
+        self.__dirty__.clear()
+        for each in self.listeners:
+            each(self)
+        return False
+
+    def connect(self, callback):
+        """Call `callback(catalog)` whenever the catalog changes"""
+        self.listeners.append(callback)
+
+    def get_applications(self):
+        """Get Menu entries for every application, sorted by desktop file ID"""
+        return [self.applications[each] for each in sorted(self.applications)]
+
+
+_catalog = None
+
+
+def get_catalog():
+    """Get the shared application catalog, loading it if needed"""
+    global _catalog
+    if _catalog is None:
+        _catalog = Catalog()
+    return _catalog
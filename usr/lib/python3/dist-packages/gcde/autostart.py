@@ -0,0 +1,206 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+#  autostart.py
+#
+#  Copyright 2020 Thomas Castleman <contact@draugeros.org>
+#
+#  This program is free software; you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation; either version 2 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software
+#  Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston,
+#  MA 02110-1301, USA.
+#
+#
+"""Autostart scheduler
+
+Rather than launching every autostart entry at once, while the Matrix is
+still starting up itself, entries are launched in order of their
+X-GNOME-Autostart-Phase, only a few at a time, each after its
+X-GNOME-Autostart-Delay. Entries in the Applications phase (the default)
+also wait for the Matrix to draw its first frame.
+
+An entry holds its place among those starting until it exits, or until it
+has had `settle` seconds to start up, whichever is first.
+"""
+import os
+import time
+import heapq
+from gi.repository import GLib
+import gcde.common as common
+import gcde.desktop as desktop
+import gcde.launcher as launcher
+import gcde.profiler as profiler
+import gcde.writeback as writeback
+
+# From the GNOME Session spec, earliest first. Unknown phases count as
+# Applications.
+PHASES = ("EarlyInitialization", "PreDisplayServer", "DisplayServer",
+          "Initialization", "WindowManager", "Panel", "Desktop",
+          "Applications")
+DEFERRED_PHASE = PHASES.index("Applications")
+
+
+class Job():
+    """One autostart entry, waiting to be launched"""
+    __slots__ = ("name", "entry", "priority", "order", "deferred", "delayed",
+                 "holding", "timing")
+
+    def __init__(self, name, entry, order):
+        self.name = name
+        self.entry = entry
+        if entry.autostart_phase in PHASES:
+            self.priority = PHASES.index(entry.autostart_phase)
+        else:
+            self.priority = DEFERRED_PHASE
+        self.order = order
+        self.deferred = self.priority >= DEFERRED_PHASE
+        self.delayed = bool(entry.autostart_delay)
+        self.holding = False
+        self.timing = {"phase":PHASES[self.priority],
+                       "delay":entry.autostart_delay or 0}
+
+    def __lt__(self, other):
+        return (self.priority, self.order) < (other.priority, other.order)
+
+
+def load_entries(prefix):
+    """Get the enabled autostart entries in `prefix`, by file name
+
+    Files without X-GNOME-Autostart-enabled have it added, set to false. Only
+    those files are written to, so once every file has it, nothing is."""
+    entries = {}
+    try:
+        file_list = sorted(os.listdir(prefix))
+    except FileNotFoundError:
+        return entries
+    for each in file_list:
+        path = os.path.join(prefix, each)
+        try:
+            with open(path, "r") as file:
+                data = file.read()
+        except (OSError, UnicodeDecodeError):
+            continue
+        entry = desktop.parse_string(data, path=path)
+        if ((entry.autostart_enabled is not False) and entry.exec and
+                entry.should_show()):
+            entries[each] = entry
+        if entry.autostart_enabled is None:
+            writeback.write_if_changed(path,
+                                       desktop.set_key(data,
+                                                       "X-GNOME-Autostart-enabled",
+                                                       "false"))
+    return entries
+
+
+class Scheduler():
+    """Launches autostart entries in order, a few at a time"""
+    def __init__(self, concurrency=2, settle=2.0):
+        """Make a scheduler which starts up to `concurrency` entries at once"""
+        self.concurrency = max(int(concurrency), 1)
+        self.settle = settle
+        self.started = None
+        self.first_frame = False
+        self.starting = 0
+        self.waiting = []
+        self.deferred = []
+        self.timings = {}
+
+    def __now__(self):
+        """Get how long it has been since start()"""
+        return time.monotonic() - self.started
+
+    def start(self, entries):
+        """Start launching `entries`, from load_entries()"""
+        self.started = time.monotonic()
+        for order, name in enumerate(entries):
+            job = Job(name, entries[name], order)
+            self.timings[name] = job.timing
+            if job.delayed:
+                GLib.timeout_add(int(job.entry.autostart_delay * 1000),
+                                 self.__delay_over__, job)
+            else:
+                self.__ready__(job)
+        self.__pump__()
+
+    def frame_drawn(self):
+        """Let deferred entries launch, now that the Matrix has been drawn"""
+        if self.first_frame:
+            return
+        self.first_frame = True
+        for each in self.deferred:
+            heapq.heappush(self.waiting, each)
+        self.deferred = []
+        self.__pump__()
+
+    def __delay_over__(self, job):
+        """Queue an entry once its X-GNOME-Autostart-Delay is over"""
+        job.delayed = False
+        self.__ready__(job)
+        self.__pump__()
+        return False
+
+    def __ready__(self, job):
+        """Queue an entry to launch, or defer it until the first frame"""
+        job.timing["ready"] = self.__now__()
+        if job.deferred and not self.first_frame:
+            self.deferred.append(job)
+        else:
+            heapq.heappush(self.waiting, job)
+
+    def __pump__(self):
+        """Launch queued entries, while there is room to"""
+        while self.waiting and self.starting < self.concurrency:
+            self.__launch__(heapq.heappop(self.waiting))
+
+    def __launch__(self, job):
+        """Launch an entry, and hold its place until it has started"""
+        start = time.monotonic()
+        job.timing["launched"] = start - self.started
+        argv = launcher.expand_field_codes(job.entry.exec, icon=job.entry.icon,
+                                           name=job.entry.name,
+                                           path=job.entry.path)
+        try:
+            launcher.spawn(argv, self.__exited__, job)
+        except GLib.Error as error:
+            common.eprint("WARNING: Could not autostart %s: %s" % (job.name,
+                                                                   error.message))
+            job.timing["error"] = error.message
+            return
+        job.timing["spawn"] = time.monotonic() - start
+        profiler.record("autostart: %s" % (job.name), start)
+        job.holding = True
+        self.starting += 1
+        GLib.timeout_add(int(self.settle * 1000), self.__settled__, job)
+
+    def __exited__(self, pid, status, job):
+        """Note when an entry exits, freeing its place if it still held one"""
+        job.timing["exited"] = self.__now__()
+        self.__release__(job)
+
+    def __settled__(self, job):
+        """Free an entry's place once it has had time to start"""
+        self.__release__(job)
+        return False
+
+    def __release__(self, job):
+        """Let another entry launch in place of `job`"""
+        if not job.holding:
+            return
+        job.holding = False
+        self.starting -= 1
+        self.__pump__()
+
+    def stats(self):
+        """Get launch timings for every entry, in seconds since start()"""
+        return {"starting":self.starting, "waiting":len(self.waiting),
+                "deferred":len(self.deferred), "entries":self.timings}
@@ -25,6 +25,7 @@
 import sys
 import os
 import json
+from collections.abc import Mapping
 from ctypes import cdll, byref, create_string_buffer
 
 
@@ -48,6 +49,121 @@ def eprint(*args, **kwargs):
     print(*args, file=sys.stderr, **kwargs)
 
 
+def get_cache_dir(sub=""):
+    """Get GCDE's cache directory (or `sub` within it), making it if needed"""
+    cache = os.getenv("XDG_CACHE_HOME")
+    if cache in (None, "", "x"):
+        cache = os.path.join(os.getenv("HOME"), ".cache")
+    path = os.path.join(cache, "gcde", sub)
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def freeze(value, version=0):
+    """Get a read-only copy of `value`
+
+    Dictionaries become Settings, and lists become tuples."""
+    if isinstance(value, Settings):
+        return value
+    if isinstance(value, dict):
+        return Settings(value, version)
+    if isinstance(value, (list, tuple)):
+        return tuple(freeze(each, version) for each in value)
+    return value
+
+
+def thaw(value):
+    """Get a plain, editable copy of `value`, undoing freeze()"""
+    if isinstance(value, Mapping):
+        return {key:thaw(value[key]) for key in value}
+    if isinstance(value, (list, tuple)):
+        return [thaw(each) for each in value]
+    return value
+
+
+def get_runtime_dir():
+    """Get where files only needed while GCDE is running (like pidfiles) live
+
+    This is $XDG_RUNTIME_DIR, or GCDE's cache directory if that isn't set."""
+    runtime = os.getenv("XDG_RUNTIME_DIR")
+    if runtime in (None, "", "x") or not os.path.isdir(runtime):
+        return get_cache_dir()
+    return runtime
+
+
+def get_pidfile(name="gcde"):
+    """Get where the pidfile for process `name` lives"""
+    return os.path.join(get_runtime_dir(), name + ".pid")
+
+
+def write_pidfile(name="gcde"):
+    """Record that this process is `name`, so others can find it quickly"""
+    path = get_pidfile(name)
+    with open(path + ".tmp", "w") as file:
+        file.write("%s\n" % (os.getpid()))
+    os.replace(path + ".tmp", path)
+    return path
+
+
+def read_pidfile(name="gcde"):
+    """Get the PID of running process `name` from its pidfile
+
+    Returns None if there is no pidfile, or if it is stale."""
+    try:
+        with open(get_pidfile(name), "r") as file:
+            pid = int(file.read().strip())
+        with open("/proc/%s/comm" % (pid), "r") as file:
+            comm = file.read().strip()
+    except (OSError, ValueError):
+        return None
+    # A stale pidfile may point at some other process which now has its PID
+    if comm != name:
+        return None
+    return pid
+
+
+def remove_pidfile(name="gcde"):
+    """Remove the pidfile for `name`, if it belongs to this process"""
+    if read_pidfile(name) == os.getpid():
+        os.remove(get_pidfile(name))
+
+
+class Settings(Mapping):
+    """Read-only snapshot of GCDE's settings
+
+    A snapshot can't be changed, so Tiles and plugins can all be handed the
+    same one, rather than a copy each. Saving settings makes a new snapshot,
+    with a higher `version`, to replace the old one."""
+    __slots__ = ("__data__", "version")
+
+    def __init__(self, data, version=0):
+        """Make a snapshot of the settings in `data`"""
+        self.__data__ = {key:freeze(data[key], version) for key in data}
+        self.version = version
+
+    def __getitem__(self, key):
+        return self.__data__[key]
+
+    def __iter__(self):
+        return iter(self.__data__)
+
+    def __len__(self):
+        return len(self.__data__)
+
+    def __repr__(self):
+        return "Settings(%r, version=%s)" % (self.__data__, self.version)
+
+    def to_dict(self):
+        """Get an editable copy of these settings, such as to save to disk"""
+        return thaw(self)
+
+    def replace(self, changes: dict):
+        """Get a new snapshot, with `changes` applied on top of this one"""
+        data = self.to_dict()
+        data.update(changes)
+        return Settings(data, self.version + 1)
+
+
 def get_settings(local_settings, global_settings="../../../etc/gcde/defaults-global.json"):
     """Get settings, global or local"""
     if os.path.exists(local_settings):
@@ -0,0 +1,292 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+#  config.py
+#
+#  Copyright 2020 Thomas Castleman <contact@draugeros.org>
+#
+#  This program is free software; you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation; either version 2 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software
+#  Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston,
+#  MA 02110-1301, USA.
+#
+#
+"""Layered configuration for GCDE
+
+Each config file in /etc/gcde can be overridden by one with the same purpose
+in ~/.config/gcde. The user's file is merged on top of the system one, so it
+only needs to hold what the user changed. Setting a key to null removes it.
+
+tiles.json used to replace the system Tiles outright, so existing ones hold
+a whole layout. Merging one of those would bring back Tiles the user had
+removed. So a user tiles.json is only merged if it has "merge": true in it,
+and replaces the system file otherwise, as before.
+
+Compiled (merged and validated) configs are cached, keyed on the mtime and
+size of the files they came from, so that most startups don't need to parse
+either file. A Watcher keeps them up to date while GCDE is running.
+"""
+import os
+import json
+from gi.repository import GLib
+import gcde.common as common
+import gcde.inotify as inotify
+
+CACHE_VERSION = 3
+SYSTEM_DIR = "/etc/gcde/"
+# Config name -> (system file, user file)
+FILES = {"settings":("defaults-global.json", "global_settings.json"),
+         "tiles":("default-tiles.json", "tiles.json")}
+# Types each global setting must have
+SETTINGS_TYPES = {"blur":(int, float),
+                  "names":bool,
+                  "icon size":(int, float),
+                  "menu":dict,
+                  "autostart":dict,
+                  "window manager":str}
+MENU_TYPES = {"width":(int, float),
+              "height":(int, float),
+              "batch size":int,
+              "virtual":bool,
+              "prebuild":bool}
+AUTOSTART_TYPES = {"concurrency":int,
+                   "settle time":(int, float)}
+POSITION_KEYS = ("X", "Y", "width", "height")
+# User files for these configs replace the system file unless they have
+# MERGE_KEY set to true, since they did before configs were merged
+REPLACING = ("tiles",)
+MERGE_KEY = "merge"
+WATCH_MASK = (inotify.IN_CLOSE_WRITE | inotify.IN_MOVED_TO |
+              inotify.IN_MOVED_FROM | inotify.IN_DELETE)
+
+
+def get_user_dir():
+    """Get the directory user config files live in"""
+    config = os.getenv("XDG_CONFIG_HOME")
+    if config in (None, "", "x"):
+        config = os.path.join(os.getenv("HOME"), ".config")
+    return os.path.join(config, "gcde", "")
+
+
+def get_paths(name):
+    """Get the system and user files for config `name`"""
+    return (SYSTEM_DIR + FILES[name][0], get_user_dir() + FILES[name][1])
+
+
+def merge(base, override):
+    """Merge `override` on top of `base`, giving a new dictionary
+
+    Dictionaries are merged key by key. Keys set to None in `override` are
+    removed."""
+    output = dict(base)
+    for key in override:
+        if override[key] is None:
+            output.pop(key, None)
+        elif isinstance(override[key], dict) and isinstance(output.get(key), dict):
+            output[key] = merge(output[key], override[key])
+        else:
+            output[key] = override[key]
+    return output
+
+
+def diff(base, target):
+    """Get what to merge on top of `base` to give `target`
+
+    This is the opposite of merge(), so user files only need to hold what
+    the user changed."""
+    output = {}
+    for key in base:
+        if key not in target:
+            output[key] = None
+    for key in target:
+        if key not in base:
+            output[key] = target[key]
+        elif isinstance(target[key], dict) and isinstance(base[key], dict):
+            changed = diff(base[key], target[key])
+            if changed:
+                output[key] = changed
+        elif target[key] != base[key]:
+            output[key] = target[key]
+    return output
+
+
+def get_overrides(name, data):
+    """Get the user file contents which make config `name` come out as `data`"""
+    return diff(_read(get_paths(name)[0]), data)
+
+
+def _stamp(path):
+    """Get what the cache of a file is keyed on"""
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return [stat.st_mtime_ns, stat.st_size]
+
+
+def _read(path):
+    """Read a JSON config file, if it exists and is valid"""
+    try:
+        with open(path, "r") as file:
+            data = json.load(file)
+    except FileNotFoundError:
+        return {}
+    except ValueError as error:
+        common.eprint("WARNING: Ignoring %s: %s" % (path, error))
+        return {}
+    if not isinstance(data, dict):
+        common.eprint("WARNING: Ignoring %s: not a JSON object" % (path))
+        return {}
+    return data
+
+
+def _check_types(data, fallback, types, where):
+    """Replace settings in `data` of the wrong type with those in `fallback`"""
+    for key in types:
+        if key in data and not isinstance(data[key], types[key]):
+            common.eprint("WARNING: Invalid setting %s%s: %r" % (where, key,
+                                                                  data[key]))
+            if key in fallback:
+                data[key] = fallback[key]
+            else:
+                del data[key]
+
+
+def validate_settings(data, system):
+    """Validate merged global settings, falling back to `system` where invalid"""
+    _check_types(data, system, SETTINGS_TYPES, "")
+    if "menu" in data:
+        _check_types(data["menu"], system.get("menu", {}), MENU_TYPES, "menu: ")
+    if "autostart" in data:
+        _check_types(data["autostart"], system.get("autostart", {}),
+                     AUTOSTART_TYPES, "autostart: ")
+    return data
+
+
+def validate_tiles(data, system):
+    """Validate merged Tile configs, dropping those which can't be placed"""
+    for name in list(data):
+        tile = data[name]
+        if not isinstance(tile, dict):
+            problem = "not a JSON object"
+        elif not all(isinstance(tile.get(key), (int, float)) for key in POSITION_KEYS):
+            problem = "X, Y, width and height must all be numbers"
+        elif "exec" in tile and not isinstance(tile["exec"], list):
+            problem = "exec must be a list"
+        else:
+            continue
+        common.eprint("WARNING: Ignoring Tile %s: %s" % (name, problem))
+        del data[name]
+    return data
+
+
+VALIDATORS = {"settings":validate_settings, "tiles":validate_tiles}
+
+
+def compile_config(name):
+    """Merge and validate config `name` from its files"""
+    system_path, user_path = get_paths(name)
+    system = _read(system_path)
+    user = _read(user_path)
+    if name in REPLACING:
+        if (user.pop(MERGE_KEY, False) is not True) and user:
+            return VALIDATORS[name](user, system)
+    data = merge(system, user)
+    return VALIDATORS[name](data, system)
+
+
+def load(name):
+    """Get config `name`, from the cache if its files haven't changed"""
+    cache = os.path.join(common.get_cache_dir(), "config-%s.json" % (name))
+    stamps = [_stamp(each) for each in get_paths(name)]
+    try:
+        with open(cache, "r") as file:
+            compiled = json.load(file)
+        if ((compiled["version"] == CACHE_VERSION) and
+                (compiled["stamps"] == stamps)):
+            return compiled["data"]
+    except (OSError, ValueError, KeyError, TypeError):
+        pass
+    data = compile_config(name)
+    try:
+        with open(cache + ".tmp", "w") as file:
+            json.dump({"version":CACHE_VERSION, "stamps":stamps, "data":data},
+                      file)
+        os.replace(cache + ".tmp", cache)
+    except OSError:
+        pass
+    return data
+
+
+class Watcher():
+    """Keep configs up to date as their files change
+
+    Callbacks connected with connect() are called with the name of the
+    config and its new contents, only when its contents actually change."""
+    def __init__(self):
+        """Start watching the system and user config directories"""
+        self.configs = {}
+        self.listeners = []
+        self.__pending__ = set()
+        self.__timeout__ = None
+        self.__files__ = {}
+        for name in FILES:
+            for path in get_paths(name):
+                self.__files__[path] = name
+        self.__start_watching__()
+
+    def __start_watching__(self):
+        """Set up inotify for both config directories"""
+        self.__inotify__ = inotify.Inotify(self.__events_ready__)
+        if not self.__inotify__.available:
+            common.eprint("WARNING: inotify unavailable, config changes need a restart")
+            return
+        self.__dirs__ = {}
+        for each in (SYSTEM_DIR, get_user_dir()):
+            wd = self.__inotify__.add_watch(each, WATCH_MASK)
+            if wd >= 0:
+                self.__dirs__[wd] = each
+
+    def __events_ready__(self, events):
+        """Work out which configs changed"""
+        for wd, mask, name in events:
+            path = self.__dirs__.get(wd, "") + name
+            if path in self.__files__:
+                self.__pending__.add(self.__files__[path])
+        # Editors often save a file in several steps, so wait for them to
+        # finish before reloading
+        if self.__pending__ and self.__timeout__ is None:
+            self.__timeout__ = GLib.timeout_add(250, self.__reload__)
+
+    def __reload__(self):
+        """Reload changed configs, and let listeners know"""
+        self.__timeout__ = None
+        pending = self.__pending__
+        self.__pending__ = set()
+        for name in pending:
+            data = load(name)
+            if data == self.configs.get(name):
+                continue
+            self.configs[name] = data
+            for each in self.listeners:
+                each(name, data)
+        return False
+
+    def load(self, name):
+        """Get config `name`, and keep it up to date from now on"""
+        self.configs[name] = load(name)
+        return self.configs[name]
+
+    def connect(self, callback):
+        """Call `callback(name, data)` whenever a config changes"""
+        self.listeners.append(callback)
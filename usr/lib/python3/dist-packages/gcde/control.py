@@ -0,0 +1,221 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+#  control.py
+#
+#  Copyright 2020 Thomas Castleman <contact@draugeros.org>
+#
+#  This program is free software; you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation; either version 2 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software
+#  Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston,
+#  MA 02110-1301, USA.
+#
+#
+"""Control socket for a running GCDE
+
+The engine listens on a Unix socket, so that scripts, the controller
+handler and benchmarks can drive it directly, rather than restarting it.
+Each request is one line of text: a command, then its arguments, separated
+by spaces. Each reply is one line of JSON, either {"ok": true, "result": ...}
+or {"ok": false, "error": "..."}. For example:
+
+    python3 -m gcde.control show-view menu
+"""
+import os
+import sys
+import json
+import time
+import socket
+from gi.repository import GLib
+import gcde.common as common
+
+SOCKET_NAME = "gcde.sock"
+# Longest request line we will buffer before giving up on a client
+MAX_REQUEST = 64 * 1024
+
+
+def get_socket_path():
+    """Get where the control socket lives"""
+    return os.path.join(common.get_runtime_dir(), SOCKET_NAME)
+
+
+class ControlServer():
+    """Non-blocking control socket server, run from the GLib main loop
+
+    Commands are functions in `commands`, keyed on name. They are called with
+    the request's arguments, and their return value (which must be JSON
+    serializable) is sent back."""
+    def __init__(self, commands, path=None):
+        """Start listening on `path` (or the default control socket)"""
+        self.commands = commands
+        self.path = path if path is not None else get_socket_path()
+        self.requests = 0
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.setblocking(False)
+        self.sock.bind(self.path)
+        os.chmod(self.path, 0o600)
+        self.__inode__ = os.stat(self.path).st_ino
+        self.sock.listen(8)
+        self.__source__ = GLib.io_add_watch(self.sock.fileno(),
+                                            GLib.PRIORITY_DEFAULT, GLib.IO_IN,
+                                            self.__accept__)
+
+    def __accept__(self, fd, condition):
+        """Accept new clients"""
+        while True:
+            try:
+                client = self.sock.accept()[0]
+            except BlockingIOError:
+                return True
+            except OSError:
+                return True
+            client.setblocking(False)
+            state = {"in":b"", "out":b"", "writing":False}
+            GLib.io_add_watch(client.fileno(), GLib.PRIORITY_DEFAULT,
+                              GLib.IO_IN | GLib.IO_HUP | GLib.IO_ERR,
+                              self.__readable__, client, state)
+
+    def __readable__(self, fd, condition, client, state):
+        """Read requests from a client, and answer them"""
+        try:
+            data = client.recv(4096)
+        except BlockingIOError:
+            return True
+        except OSError:
+            data = b""
+        if len(data) == 0:
+            client.close()
+            return False
+        state["in"] += data
+        while b"\n" in state["in"]:
+            line, state["in"] = state["in"].split(b"\n", 1)
+            state["out"] += self.handle(line.decode(errors="replace"))
+        if len(state["in"]) > MAX_REQUEST:
+            client.close()
+            return False
+        return self.__flush__(client, state)
+
+    def __flush__(self, client, state):
+        """Send as much of the reply as the client will take"""
+        try:
+            sent = client.send(state["out"])
+            state["out"] = state["out"][sent:]
+        except BlockingIOError:
+            pass
+        except OSError:
+            client.close()
+            return False
+        if state["out"] and not state["writing"]:
+            # Finish sending once the client has caught up
+            state["writing"] = True
+            GLib.io_add_watch(client.fileno(), GLib.PRIORITY_DEFAULT,
+                              GLib.IO_OUT, self.__writable__, client, state)
+        return True
+
+    def __writable__(self, fd, condition, client, state):
+        """Carry on sending a reply"""
+        if client.fileno() < 0:
+            return False
+        try:
+            sent = client.send(state["out"])
+            state["out"] = state["out"][sent:]
+        except BlockingIOError:
+            return True
+        except OSError:
+            return False
+        state["writing"] = len(state["out"]) > 0
+        return state["writing"]
+
+    def handle(self, line):
+        """Run the command in request `line`, giving the encoded reply"""
+        self.requests += 1
+        args = line.split()
+        if len(args) == 0:
+            reply = {"ok":False, "error":"empty request"}
+        elif args[0] not in self.commands:
+            reply = {"ok":False, "error":"unknown command: %s" % (args[0])}
+        else:
+            try:
+                reply = {"ok":True, "result":self.commands[args[0]](*args[1:])}
+            except Exception as error:
+                reply = {"ok":False, "error":"%s: %s" % (type(error).__name__,
+                                                         error)}
+        return (json.dumps(reply) + "\n").encode()
+
+    def close(self):
+        """Stop listening, and remove the socket
+
+        If another GCDE has already replaced the socket with its own (such
+        as when restarting), that one is left alone."""
+        GLib.source_remove(self.__source__)
+        self.sock.close()
+        try:
+            if os.stat(self.path).st_ino == self.__inode__:
+                os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+
+def send(command, *args, path=None, timeout=5):
+    """Send `command` to a running GCDE, returning its reply
+
+    Raises ConnectionError if GCDE isn't running, and RuntimeError if the
+    command failed."""
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.settimeout(timeout)
+        try:
+            sock.connect(path if path is not None else get_socket_path())
+        except (FileNotFoundError, ConnectionRefusedError) as error:
+            raise ConnectionError("GCDE is not running") from error
+        sock.sendall((" ".join((command,) + args) + "\n").encode())
+        data = b""
+        while not data.endswith(b"\n"):
+            chunk = sock.recv(4096)
+            if len(chunk) == 0:
+                break
+            data += chunk
+    reply = json.loads(data)
+    if not reply["ok"]:
+        raise RuntimeError(reply["error"])
+    return reply["result"]
+
+
+def benchmark(rounds=1000, path=None):
+    """Time round trips to a running GCDE, in microseconds"""
+    times = []
+    for each in range(rounds):
+        start = time.monotonic()
+        send("ping", path=path)
+        times.append((time.monotonic() - start) * 1000000)
+    times.sort()
+    return {"rounds":rounds, "min":times[0], "median":times[len(times) // 2],
+            "max":times[-1]}
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        common.eprint("Usage: %s <command> [args...]" % (sys.argv[0]))
+        sys.exit(2)
+    if sys.argv[1] == "benchmark":
+        print(json.dumps(benchmark(*[int(each) for each in sys.argv[2:3]]),
+                         indent=1))
+        sys.exit(0)
+    try:
+        print(json.dumps(send(*sys.argv[1:]), indent=1))
+    except (ConnectionError, RuntimeError) as error:
+        common.eprint(error)
+        sys.exit(1)
@@ -0,0 +1,199 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+#  desktop.py
+#
+#  Copyright 2020 Thomas Castleman <contact@draugeros.org>
+#
+#  This program is free software; you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation; either version 2 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software
+#  Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston,
+#  MA 02110-1301, USA.
+#
+#
+"""Desktop entry (.desktop file) parser
+
+Reads a file once, only looks at the [Desktop Entry] group, and returns a
+compact DesktopEntry record. Localized keys (such as Name[de]) are ignored.
+
+Run this module directly to benchmark it against a directory of .desktop
+files:
+
+    python3 /usr/lib/python3/dist-packages/gcde/desktop.py [directory]
+"""
+import os
+import sys
+import math
+import time
+import shlex
+import shutil
+
+GROUP = "[Desktop Entry]"
+
+# .desktop keys we care about, and the DesktopEntry attribute they go in
+STRING_KEYS = {"Type":"type", "Name":"name", "GenericName":"generic_name",
+               "Icon":"icon", "TryExec":"try_exec",
+               "X-GNOME-Autostart-Phase":"autostart_phase"}
+BOOLEAN_KEYS = {"Terminal":"terminal", "NoDisplay":"no_display",
+                "Hidden":"hidden",
+                "X-GNOME-Autostart-enabled":"autostart_enabled"}
+LIST_KEYS = {"OnlyShowIn":"only_show_in", "NotShowIn":"not_show_in",
+             "Keywords":"keywords", "Categories":"categories"}
+# Longest X-GNOME-Autostart-Delay honoured, in seconds
+MAX_AUTOSTART_DELAY = 60 * 60
+
+
+class DesktopEntry():
+    """Parsed .desktop file
+
+    Keys missing from the file are None (or empty, for lists)"""
+    __slots__ = ("path", "type", "name", "generic_name", "icon", "exec",
+                 "try_exec", "terminal", "no_display", "hidden",
+                 "only_show_in", "not_show_in", "keywords", "categories",
+                 "autostart_enabled", "autostart_delay", "autostart_phase")
+
+    def __init__(self, path=None):
+        """Make an empty entry"""
+        self.path = path
+        for each in self.__slots__[1:]:
+            setattr(self, each, None)
+        for each in LIST_KEYS.values():
+            setattr(self, each, ())
+
+    def should_show(self, desktop="GCDE"):
+        """Check if this entry should be shown (or run) in `desktop`
+
+        Follows NoDisplay, Hidden, OnlyShowIn, NotShowIn and TryExec"""
+        if self.no_display or self.hidden:
+            return False
+        desktop = desktop.lower()
+        if self.only_show_in:
+            if desktop not in (each.lower() for each in self.only_show_in):
+                return False
+        if desktop in (each.lower() for each in self.not_show_in):
+            return False
+        if self.try_exec:
+            if os.path.isabs(self.try_exec):
+                return os.access(self.try_exec, os.X_OK)
+            return shutil.which(self.try_exec) is not None
+        return True
+
+
+def _unescape(value):
+    """Undo escape sequences in a .desktop string value"""
+    if "\\" not in value:
+        return value
+    return (value.replace("\\\\", "\0").replace("\\s", " ")
+            .replace("\\n", "\n").replace("\\t", "\t").replace("\\r", "\r")
+            .replace("\0", "\\"))
+
+
+def parse_string(data, path=None):
+    """Parse the contents of a .desktop file into a DesktopEntry"""
+    entry = DesktopEntry(path=path)
+    in_group = False
+    for line in data.split("\n"):
+        if not line or line[0] == "#":
+            continue
+        if line[0] == "[":
+            if in_group:
+                # The [Desktop Entry] group is over
+                break
+            in_group = line.rstrip() == GROUP
+            continue
+        if not in_group:
+            continue
+        key, sep, value = line.partition("=")
+        if not sep:
+            continue
+        key = key.strip()
+        value = value.strip()
+        if key in STRING_KEYS:
+            setattr(entry, STRING_KEYS[key], _unescape(value))
+        elif key in BOOLEAN_KEYS:
+            setattr(entry, BOOLEAN_KEYS[key], value == "true")
+        elif key in LIST_KEYS:
+            setattr(entry, LIST_KEYS[key],
+                    tuple(_unescape(each) for each in value.split(";") if each))
+        elif key == "Exec":
+            try:
+                entry.exec = shlex.split(value)
+            except ValueError:
+                entry.exec = None
+        elif key == "X-GNOME-Autostart-Delay":
+            try:
+                delay = float(value)
+            except ValueError:
+                continue
+            # Negative, infinite and NaN delays can't be waited for
+            if math.isfinite(delay):
+                entry.autostart_delay = min(max(delay, 0), MAX_AUTOSTART_DELAY)
+    return entry
+
+
+def set_key(data, key, value):
+    """Get `data`, the contents of a .desktop file, with `key` set to `value`
+
+    Only the [Desktop Entry] group is changed. If `key` isn't there yet, it
+    is added to the end of the group."""
+    lines = data.split("\n")
+    in_group = False
+    end = len(lines)
+    for index, line in enumerate(lines):
+        if line[:1] == "[":
+            if in_group:
+                end = index
+                break
+            in_group = line.rstrip() == GROUP
+            continue
+        if in_group and line.partition("=")[0].strip() == key:
+            lines[index] = "%s=%s" % (key, value)
+            return "\n".join(lines)
+    while end > 0 and lines[end - 1].strip() == "":
+        end -= 1
+    lines.insert(end, "%s=%s" % (key, value))
+    if lines[-1] != "":
+        lines.append("")
+    return "\n".join(lines)
+
+
+def parse(path):
+    """Parse the .desktop file at `path` into a DesktopEntry"""
+    with open(path, "r") as file:
+        return parse_string(file.read(), path=path)
+
+
+def benchmark(directory="/usr/share/applications", rounds=20):
+    """Time how long parsing each .desktop file in `directory` takes"""
+    paths = [os.path.join(directory, each) for each in os.listdir(directory)
+             if each.endswith(".desktop")]
+    if not paths:
+        print("No .desktop files in %s" % (directory))
+        return
+    start = time.perf_counter()
+    for each in range(rounds):
+        for path in paths:
+            try:
+                parse(path)
+            except (OSError, UnicodeDecodeError):
+                pass
+    taken = time.perf_counter() - start
+    print("%s files, %s rounds: %.1f µs per file" % (len(paths), rounds,
+                                                     (taken / (rounds * len(paths))) * 10 ** 6))
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        benchmark(sys.argv[1])
+    else:
+        benchmark()
@@ -0,0 +1,503 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+#  icons.py
+#
+#  Copyright 2020 Thomas Castleman <contact@draugeros.org>
+#
+#  This program is free software; you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation; either version 2 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software
+#  Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston,
+#  MA 02110-1301, USA.
+#
+#
+"""Icon loading and caching for GCDE Tiles"""
+import os
+import json
+import mmap
+import struct
+import configparser
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import gi
+gi.require_version('Gtk', '3.0')
+from gi.repository import Gtk, GdkPixbuf, GLib
+import gcde.common as common
+
+DISK_CACHE_MAGIC = b"GCDEICO2"
+NAME_INDEX_VERSION = 1
+ICON_EXTENSIONS = (".png", ".svg", ".xpm")
+
+
+class PixbufCache():
+    """Bounded LRU cache of GdkPixbufs
+
+    Least recently used pixbufs are evicted once the total size of cached
+    pixel data goes over `max_bytes`."""
+    def __init__(self, max_bytes=32 * 1024 * 1024):
+        """Initialize the cache"""
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.__cache__ = OrderedDict()
+
+    def get(self, key):
+        """Get the pixbuf cached under `key`, or None"""
+        try:
+            pixbuf = self.__cache__[key]
+        except KeyError:
+            self.misses += 1
+            return None
+        self.__cache__.move_to_end(key)
+        self.hits += 1
+        return pixbuf
+
+    def put(self, key, pixbuf):
+        """Cache `pixbuf` under `key`, evicting old pixbufs as needed"""
+        if key in self.__cache__:
+            self.bytes -= self.__cache__.pop(key).get_byte_length()
+        self.__cache__[key] = pixbuf
+        self.bytes += pixbuf.get_byte_length()
+        while self.bytes > self.max_bytes and len(self.__cache__) > 1:
+            self.bytes -= self.__cache__.popitem(last=False)[1].get_byte_length()
+
+    def clear(self):
+        """Empty the cache"""
+        self.__cache__.clear()
+        self.bytes = 0
+
+    def stats(self):
+        """Get cache statistics"""
+        return {"entries":len(self.__cache__), "bytes":self.bytes,
+                "max bytes":self.max_bytes, "hits":self.hits,
+                "misses":self.misses}
+
+
+class DiskCache():
+    """Pre-scaled icons for one icon theme and size, stored on disk
+
+    Icons are stored as raw pixel data, one after another, in a single file
+    which is memory mapped, so loading an icon from it doesn't need to
+    decode (or rasterize) anything. New icons are only ever appended to it.
+
+    A small JSON index next to it maps icon names to where their pixel data
+    is, how much of the data file is valid, and records a stamp of the icon
+    theme's directories. If the theme changes on disk, the stamp won't match
+    and the cache is thrown out."""
+    def __init__(self, theme, size):
+        """Open the cache for `theme` at `size`"""
+        self.theme = theme
+        self.size = size
+        self.path = os.path.join(common.get_cache_dir("icons"),
+                                 "%s-%s.cache" % (theme, size))
+        self.index_path = self.path + ".json"
+        self.stamp = get_theme_stamp(theme)
+        self.icons = {}
+        self.pending = {}
+        self.__map__ = None
+        # How much of the data file is in use, or None to start it again
+        self.__length__ = None
+        self.__save_source__ = None
+        self.__open__()
+
+    def __open__(self):
+        """Load the index and map the data file, discarding both if out of date"""
+        self.icons = {}
+        self.__length__ = None
+        try:
+            with open(self.index_path, "r") as file:
+                index = json.load(file)
+            if index["stamp"] != self.stamp:
+                raise ValueError("Icon theme has changed")
+            self.__map_data__(index["length"])
+            self.icons = index["icons"]
+            self.__length__ = index["length"]
+        except (OSError, ValueError, KeyError, TypeError):
+            if self.__map__ is not None:
+                self.__map__.close()
+                self.__map__ = None
+
+    def __map_data__(self, length):
+        """Map the first `length` bytes of the data file"""
+        if self.__map__ is not None:
+            self.__map__.close()
+            self.__map__ = None
+        with open(self.path, "rb") as file:
+            self.__map__ = mmap.mmap(file.fileno(), length,
+                                     access=mmap.ACCESS_READ)
+        if self.__map__[:8] != DISK_CACHE_MAGIC:
+            raise ValueError("Not a GCDE icon cache")
+
+    def get(self, name):
+        """Get pre-scaled icon `name`, or None if it isn't cached"""
+        if name in self.pending:
+            return self.pending[name]
+        try:
+            offset, length, width, height, rowstride, alpha, mtime = self.icons[name]
+        except KeyError:
+            return None
+        if mtime is not None:
+            # Icons given as a path are checked against the file
+            try:
+                if os.stat(name).st_mtime_ns != mtime:
+                    return None
+            except OSError:
+                return None
+        data = GLib.Bytes.new(self.__map__[offset:offset + length])
+        return GdkPixbuf.Pixbuf.new_from_bytes(data,
+                                               GdkPixbuf.Colorspace.RGB,
+                                               alpha, 8, width, height,
+                                               rowstride)
+
+    def put(self, name, pixbuf):
+        """Add `pixbuf` to the cache
+
+        Pixbufs are written out shortly after, rather than every time one
+        is added."""
+        self.pending[name] = pixbuf
+        if self.__save_source__ is None:
+            self.__save_source__ = GLib.timeout_add_seconds(5, self.save)
+
+    def save(self):
+        """Append any new icons to the data file, and write the index
+
+        Only the new pixel data is written, so saving costs the same however
+        big the cache has grown. Anything past the end recorded in the index
+        (such as from being interrupted part way through a save) is cut off
+        first."""
+        self.__save_source__ = None
+        if not self.pending:
+            return False
+        icons = dict(self.icons)
+        try:
+            with open(self.path, "r+b" if self.__length__ is not None else "wb") as file:
+                if self.__length__ is None:
+                    file.write(DISK_CACHE_MAGIC)
+                    offset = len(DISK_CACHE_MAGIC)
+                    icons = {}
+                else:
+                    offset = self.__length__
+                    file.seek(offset)
+                file.truncate(offset)
+                for name in self.pending:
+                    pixbuf = self.pending[name]
+                    mtime = None
+                    if name and os.path.isabs(name):
+                        try:
+                            mtime = os.stat(name).st_mtime_ns
+                        except OSError:
+                            continue
+                    data = pixbuf.read_pixel_bytes().get_data()
+                    file.write(data)
+                    icons[name] = [offset, len(data), pixbuf.get_width(),
+                                   pixbuf.get_height(), pixbuf.get_rowstride(),
+                                   pixbuf.get_has_alpha(), mtime]
+                    offset += len(data)
+            with open(self.index_path + ".tmp", "w") as file:
+                json.dump({"theme":self.theme, "size":self.size,
+                           "stamp":self.stamp, "length":offset,
+                           "icons":icons}, file)
+            os.replace(self.index_path + ".tmp", self.index_path)
+            self.__map_data__(offset)
+        except (OSError, ValueError):
+            # Start again next time, rather than trusting a half-written file
+            self.__open__()
+            return False
+        self.icons = icons
+        self.__length__ = offset
+        self.pending = {}
+        return False
+
+
+# Shared by every Tile, including plugin Tiles
+cache = PixbufCache()
+_disk_caches = {}
+_name_indexes = {}
+# Icons are decoded on a small pool of worker threads. GTK itself is only
+# ever touched from the main loop.
+_pool = None
+_loading = {}
+
+
+def get_theme_stamp(theme):
+    """Get a stamp of the directories making up icon theme `theme`
+
+    The stamp changes whenever icons are added to or removed from the theme
+    (or the hicolor fallback theme)."""
+    stamp = []
+    for each in Gtk.IconTheme.get_default().get_search_path():
+        for name in (theme, "hicolor"):
+            try:
+                stamp.append(os.stat(os.path.join(each, name)).st_mtime_ns)
+            except OSError:
+                pass
+    return stamp
+
+
+def get_disk_cache(theme, size):
+    """Get the on-disk icon cache for `theme` at `size`"""
+    key = (theme, size)
+    if key not in _disk_caches:
+        _disk_caches[key] = DiskCache(theme, size)
+    return _disk_caches[key]
+
+
+def _read_theme_index(theme, search_path):
+    """Get the index.theme for `theme`, as a ConfigParser, and where it is"""
+    for each in search_path:
+        path = os.path.join(each, theme, "index.theme")
+        index = configparser.ConfigParser(interpolation=None, strict=False)
+        try:
+            with open(path, "r") as file:
+                index.read_file(file)
+        except (OSError, UnicodeDecodeError, configparser.Error):
+            continue
+        return (index, os.path.join(each, theme))
+    return (None, None)
+
+
+def _theme_chain(theme, search_path, chain=None):
+    """Get `theme` and the themes it inherits from, in lookup order"""
+    if chain is None:
+        chain = []
+    if theme in chain:
+        return chain
+    chain.append(theme)
+    index = _read_theme_index(theme, search_path)[0]
+    if index is not None:
+        inherits = index.get("Icon Theme", "Inherits", fallback="")
+        for each in inherits.split(","):
+            if each.strip():
+                _theme_chain(each.strip(), search_path, chain=chain)
+    return chain
+
+
+def _size_distance(section, size):
+    """Get how far directory `section` of an index.theme is from `size`
+
+    This follows the Icon Theme Specification's DirectorySizeDistance"""
+    dir_size = section.getint("Size", fallback=48)
+    dir_type = section.get("Type", fallback="Threshold")
+    if dir_type == "Fixed":
+        return abs(dir_size - size)
+    if dir_type == "Scalable":
+        min_size = section.getint("MinSize", fallback=dir_size)
+        max_size = section.getint("MaxSize", fallback=dir_size)
+        if size < min_size:
+            return min_size - size
+        if size > max_size:
+            return size - max_size
+        return 0
+    threshold = section.getint("Threshold", fallback=2)
+    if size < dir_size - threshold:
+        return dir_size - threshold - size
+    if size > dir_size + threshold:
+        return size - dir_size - threshold
+    return 0
+
+
+def build_name_index(theme, size):
+    """Build an index of icon names to the best file for them in `theme`
+
+    Icons are looked up through `theme`, the themes it inherits from,
+    hicolor, and finally loose pixmaps, the same way GTK does it."""
+    search_path = Gtk.IconTheme.get_default().get_search_path()
+    chain = _theme_chain(theme, search_path)
+    if "hicolor" not in chain:
+        chain.append("hicolor")
+    icons = {}
+    roots = []
+    for each in chain:
+        found = {}
+        for base in search_path:
+            root = os.path.join(base, each)
+            try:
+                roots.append([root, os.stat(root).st_mtime_ns])
+            except OSError:
+                continue
+        index = _read_theme_index(each, search_path)[0]
+        if index is None:
+            continue
+        directories = index.get("Icon Theme", "Directories", fallback="")
+        for directory in directories.split(","):
+            directory = directory.strip()
+            if not index.has_section(directory):
+                continue
+            section = index[directory]
+            if section.getint("Scale", fallback=1) != 1:
+                continue
+            distance = _size_distance(section, size)
+            for base in search_path:
+                try:
+                    listing = os.scandir(os.path.join(base, each, directory))
+                except OSError:
+                    continue
+                with listing:
+                    for file in listing:
+                        name, ext = os.path.splitext(file.name)
+                        if ext not in ICON_EXTENSIONS:
+                            continue
+                        if name not in found or distance < found[name][0]:
+                            found[name] = (distance, file.path)
+        for name in found:
+            if name not in icons:
+                icons[name] = found[name][1]
+    # Loose icons, such as those in /usr/share/pixmaps, come last
+    for base in search_path:
+        try:
+            listing = os.scandir(base)
+        except OSError:
+            continue
+        with listing:
+            for file in listing:
+                name, ext = os.path.splitext(file.name)
+                if ext in ICON_EXTENSIONS and name not in icons:
+                    icons[name] = file.path
+    return {"version":NAME_INDEX_VERSION, "theme":theme, "size":size,
+            "roots":roots, "icons":icons}
+
+
+def _name_index_valid(index):
+    """Check if the theme directories an index was built from are unchanged"""
+    if index.get("version") != NAME_INDEX_VERSION:
+        return False
+    for root, mtime in index["roots"]:
+        try:
+            if os.stat(root).st_mtime_ns != mtime:
+                return False
+        except OSError:
+            return False
+    return True
+
+
+def get_name_index(theme, size):
+    """Get the icon name index for `theme` at `size`
+
+    The index is kept on disk, and only rebuilt when one of the theme's
+    directories changes."""
+    key = (theme, size)
+    if key in _name_indexes:
+        return _name_indexes[key]
+    path = os.path.join(common.get_cache_dir("icons"),
+                        "%s-%s.index.json" % (theme, size))
+    try:
+        with open(path, "r") as file:
+            index = json.load(file)
+        if not _name_index_valid(index):
+            raise ValueError("Icon theme has changed")
+    except (FileNotFoundError, ValueError, KeyError):
+        index = build_name_index(theme, size)
+        with open(path + ".tmp", "w") as file:
+            json.dump(index, file)
+        os.replace(path + ".tmp", path)
+    _name_indexes[key] = index["icons"]
+    return index["icons"]
+
+
+def get_theme_name():
+    """Get the name of the icon theme in use"""
+    return Gtk.Settings.get_default().props.gtk_icon_theme_name
+
+
+def lookup(name, size=48):
+    """Get the file to load for icon `name`, falling back to "unknown".
+
+    Names are resolved with the icon theme's name index, only falling back
+    to GTK's (much slower) lookup for names missing from it."""
+    if name and os.path.isabs(name) and os.path.exists(name):
+        return name
+    index = get_name_index(get_theme_name(), size)
+    if name in index:
+        return index[name]
+    icon_theme = Gtk.IconTheme.get_default()
+    icon_info = None
+    if name:
+        icon_info = icon_theme.lookup_icon(name, 48, 0)
+    if icon_info is None:
+        icon_info = icon_theme.lookup_icon("unknown", 48, 0)
+    return icon_info.get_filename()
+
+
+def load_icon(name, size):
+    """Get a pixbuf of icon `name`, scaled to `size` x `size`
+
+    Pixbufs are cached in memory, keyed on icon name, icon theme and size,
+    and already-scaled pixel data is kept on disk, so icons only need to be
+    decoded the first time they are ever used."""
+    size = int(size)
+    theme = get_theme_name()
+    key = (name, theme, size)
+    pixbuf = cache.get(key)
+    if pixbuf is not None:
+        return pixbuf
+    disk = get_disk_cache(theme, size)
+    pixbuf = disk.get(name)
+    if pixbuf is None:
+        pixbuf = GdkPixbuf.Pixbuf.new_from_file_at_scale(lookup(name, size),
+                                                         size, size, False)
+        disk.put(name, pixbuf)
+    cache.put(key, pixbuf)
+    return pixbuf
+
+
+def get_pool():
+    """Get the thread pool icons are decoded on"""
+    global _pool
+    if _pool is None:
+        _pool = ThreadPoolExecutor(max_workers=min(4, os.cpu_count() or 1),
+                                   thread_name_prefix="gcde-icons")
+    return _pool
+
+
+def load_icon_async(name, size, callback, *args):
+    """Load icon `name`, scaled to `size` x `size`, off the main thread
+
+    If the icon is already cached, it is returned right away and `callback`
+    is never called. Otherwise, None is returned and, once the icon has been
+    decoded, `callback(pixbuf, *args)` is called from the GLib main loop.
+    Requests for an icon which is already being decoded share its result."""
+    size = int(size)
+    theme = get_theme_name()
+    key = (name, theme, size)
+    pixbuf = cache.get(key)
+    if pixbuf is not None:
+        return pixbuf
+    pixbuf = get_disk_cache(theme, size).get(name)
+    if pixbuf is not None:
+        cache.put(key, pixbuf)
+        return pixbuf
+    if key in _loading:
+        _loading[key].append((callback, args))
+        return None
+    _loading[key] = [(callback, args)]
+    # Name lookups may need GTK, so they stay on the main thread
+    future = get_pool().submit(GdkPixbuf.Pixbuf.new_from_file_at_scale,
+                               lookup(name, size), size, size, False)
+    future.add_done_callback(lambda done: GLib.idle_add(_icon_loaded, key,
+                                                         done))
+    return None
+
+
+def _icon_loaded(key, future):
+    """Cache a decoded icon and hand it to whoever asked for it"""
+    name, theme, size = key
+    try:
+        pixbuf = future.result()
+        get_disk_cache(theme, size).put(name, pixbuf)
+        cache.put(key, pixbuf)
+    except GLib.Error:
+        pixbuf = load_icon("unknown", size)
+    for callback, args in _loading.pop(key, []):
+        callback(pixbuf, *args)
+    return False
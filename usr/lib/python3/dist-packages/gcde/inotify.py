@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+#  inotify.py
+#
+#  Copyright 2020 Thomas Castleman <contact@draugeros.org>
+#
+#  This program is free software; you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation; either version 2 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software
+#  Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston,
+#  MA 02110-1301, USA.
+#
+#
+"""inotify, hooked into the GLib main loop
+
+Used by the application catalog and the config Watcher to find out about
+changed files without polling. libc is called through ctypes, so nothing
+beyond the standard library is needed.
+"""
+import os
+import ctypes
+import struct
+from gi.repository import GLib
+
+# From <sys/inotify.h>
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_MASK_ADD = 0x20000000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+EVENT_HEADER = struct.Struct("iIII")
+
+
+def decode(data):
+    """Get (watch descriptor, mask, name) for each event in `data`"""
+    output = []
+    offset = 0
+    while offset < len(data):
+        wd, mask, cookie, length = EVENT_HEADER.unpack_from(data, offset)
+        offset += EVENT_HEADER.size
+        name = data[offset:offset + length].rstrip(b"\0").decode(errors="replace")
+        offset += length
+        output.append((wd, mask, name))
+    return output
+
+
+class Inotify():
+    """An inotify instance, read from the GLib main loop
+
+    `callback(events)` is called with a list of (watch descriptor, mask,
+    name) for every batch of events read. If inotify can't be used,
+    `available` is False and add_watch() does nothing."""
+    def __init__(self, callback):
+        """Set up inotify, and hook it into the GLib main loop"""
+        self.callback = callback
+        self.fd = None
+        try:
+            self.__libc__ = ctypes.CDLL("libc.so.6", use_errno=True)
+            fd = self.__libc__.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        except (OSError, AttributeError):
+            fd = -1
+        if fd < 0:
+            return
+        self.fd = fd
+        GLib.io_add_watch(fd, GLib.PRIORITY_DEFAULT, GLib.IO_IN,
+                          self.__events_ready__)
+
+    @property
+    def available(self):
+        """Whether inotify is working"""
+        return self.fd is not None
+
+    def add_watch(self, path, mask):
+        """Watch `path` for events in `mask`
+
+        Returns the watch descriptor, or -1 if it can't be watched."""
+        if self.fd is None:
+            return -1
+        return self.__libc__.inotify_add_watch(self.fd, path.encode(), mask)
+
+    def rm_watch(self, wd):
+        """Stop watching watch descriptor `wd`"""
+        if self.fd is not None:
+            self.__libc__.inotify_rm_watch(self.fd, wd)
+
+    def __events_ready__(self, fd, condition):
+        """Read waiting events and pass them on"""
+        try:
+            data = os.read(fd, 64 * 1024)
+        except BlockingIOError:
+            return True
+        self.callback(decode(data))
+        return True
@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+#  launcher.py
+#
+#  Copyright 2020 Thomas Castleman <contact@draugeros.org>
+#
+#  This program is free software; you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation; either version 2 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software
+#  Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston,
+#  MA 02110-1301, USA.
+#
+#
+"""Application launcher
+
+Launches applications with GLib.spawn_async, which uses posix_spawn where
+it can, rather than forking all of GCDE with subprocess.Popen. Launches
+requested from click handlers are done from the main loop once GTK is
+idle, so the click itself is never held up. Every child is reaped with a
+GLib child watch once it exits, so launched applications don't become
+zombies.
+
+Exec lines from .desktop files may have field codes (%u, %F, %i and so on)
+in them. expand_field_codes() expands those as the Desktop Entry spec says.
+It is only for Exec lines: commands from tiles.json and plugins are run
+exactly as given, so a "%" in them is left alone.
+"""
+import time
+import collections
+from gi.repository import GLib
+import gcde.common as common
+
+SPAWN_FLAGS = GLib.SpawnFlags.SEARCH_PATH | GLib.SpawnFlags.DO_NOT_REAP_CHILD
+# Field codes which expand to nothing, either because they are deprecated,
+# or because GCDE never launches applications with files
+EMPTY_CODES = ("%f", "%F", "%u", "%U", "%d", "%D", "%n", "%N", "%v", "%m")
+
+running = {}
+_latencies = collections.deque(maxlen=100)
+_counts = {"launched":0, "failed":0}
+
+
+def expand_field_codes(argv, files=(), icon=None, name=None, path=None):
+    """Expand Desktop Entry field codes in `argv`
+
+    `files` are the files or URLs to open, `icon` and `name` are the entry's
+    Icon and Name, and `path` is the .desktop file it came from."""
+    output = []
+    for each in argv:
+        if each in ("%F", "%U"):
+            output.extend(files)
+            continue
+        if each in ("%f", "%u"):
+            output.extend(files[:1])
+            continue
+        if each == "%i":
+            if icon:
+                output.extend(("--icon", icon))
+            continue
+        if "%" not in each:
+            output.append(each)
+            continue
+        arg = ""
+        index = 0
+        while index < len(each):
+            if each[index] == "%" and index + 1 < len(each):
+                code = each[index:index + 2]
+                if code == "%%":
+                    arg += "%"
+                elif code == "%c":
+                    arg += name or ""
+                elif code == "%k":
+                    arg += path or ""
+                elif code not in EMPTY_CODES:
+                    arg += code
+                index += 2
+            else:
+                arg += each[index]
+                index += 1
+        if arg:
+            output.append(arg)
+    return output
+
+
+def spawn(argv, on_exit=None, *args):
+    """Start `argv` now, returning its PID
+
+    Once it exits, it is reaped, and `on_exit(pid, status, *args)` is called.
+    Raises GLib.Error if it can't be started."""
+    start = time.monotonic()
+    try:
+        pid = GLib.spawn_async(argv, flags=SPAWN_FLAGS)[0]
+    except GLib.Error:
+        _counts["failed"] += 1
+        raise
+    _latencies.append(time.monotonic() - start)
+    _counts["launched"] += 1
+    running[int(pid)] = argv
+    GLib.child_watch_add(GLib.PRIORITY_DEFAULT, pid, _reap, (on_exit, args))
+    return int(pid)
+
+
+def _reap(pid, status, data):
+    """Clean up after a child which exited"""
+    running.pop(int(pid), None)
+    GLib.spawn_close_pid(pid)
+    on_exit, args = data
+    if on_exit is not None:
+        on_exit(int(pid), status, *args)
+
+
+def launch(argv):
+    """Launch `argv` once GTK is idle
+
+    Safe to call straight from a click handler."""
+    if len(argv) == 0 or argv[0] == "":
+        return
+    GLib.idle_add(_launch, argv)
+
+
+def _launch(argv):
+    """Start `argv`, as a GLib idle callback"""
+    try:
+        spawn(argv)
+    except GLib.Error as error:
+        common.eprint("WARNING: Could not launch %s: %s" % (argv[0],
+                                                            error.message))
+    return False
+
+
+def stats():
+    """Get launch counts, and how long spawning took, in milliseconds"""
+    latencies = [each * 1000 for each in _latencies]
+    return {"launched":_counts["launched"], "failed":_counts["failed"],
+            "running":len(running),
+            "spawn ms":{"last":latencies[-1] if latencies else None,
+                        "mean":(sum(latencies) / len(latencies)
+                                if latencies else None),
+                        "max":max(latencies) if latencies else None}}
@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+#  layout.py
+#
+#  Copyright 2020 Thomas Castleman <contact@draugeros.org>
+#
+#  This program is free software; you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation; either version 2 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software
+#  Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston,
+#  MA 02110-1301, USA.
+#
+#
+"""Compact layout for Tiles and other widgets in a Gtk.Grid
+
+Views are laid out in a homogeneous Gtk.Grid, where every column (and every
+row) is the same size. So, a layout only needs as many columns as it takes
+to keep every edge where it is relative to the others. compress() finds
+that smallest grid, so that GTK isn't left sizing thousands of columns when
+something is placed using pixel counts.
+"""
+import bisect
+import functools
+import math
+
+
+def _lattice(values):
+    """Get the largest step which every value in `values` is a multiple of"""
+    step = 0
+    for each in values:
+        step = math.gcd(step, each)
+    return max(step, 1)
+
+
+@functools.lru_cache(maxsize=32)
+def compress(rects: tuple):
+    """Compress `rects`, a tuple of (X, Y, width, height) tuples
+
+    Returns (columns, rows, compressed), where `compressed` has the same
+    rects, in the same order, placed on the smallest grid which keeps them
+    in proportion. Results are cached, so a view with the same layout as
+    before costs nothing to lay out again. Positions and sizes are rounded
+    to whole cells first, since tiles.json may give them as floats."""
+    if len(rects) == 0:
+        return (0, 0, ())
+    rects = tuple(tuple(int(round(value)) for value in each) for each in rects)
+    x_min = min(each[0] for each in rects)
+    y_min = min(each[1] for each in rects)
+    x_step = _lattice(value for each in rects
+                      for value in (each[0] - x_min, each[2]))
+    y_step = _lattice(value for each in rects
+                      for value in (each[1] - y_min, each[3]))
+    compressed = tuple(((each[0] - x_min) // x_step,
+                        (each[1] - y_min) // y_step,
+                        max(each[2] // x_step, 1),
+                        max(each[3] // y_step, 1)) for each in rects)
+    columns = max(each[0] + each[2] for each in compressed)
+    rows = max(each[1] + each[3] for each in compressed)
+    return (columns, rows, compressed)
+
+
+class Occupancy():
+    """Spatial index of which cells of the Matrix are taken, and by which Tile
+
+    Each row keeps the spans taken in it sorted by their starting column,
+    so checking a span, or skipping past whatever is in the way, is a
+    binary search rather than a scan of every Tile."""
+    def __init__(self, columns: int):
+        """Make an empty index for a Matrix `columns` wide
+
+        Tiles may be placed past `columns`, but free slots are only looked
+        for within it."""
+        self.columns = max(columns, 1)
+        # row -> ([start, ...], [(start, end, name), ...]), sorted by start
+        self.rows = {}
+        # Every cell before this one (by row, then column) is taken
+        self.cursor = (0, 0)
+
+    def __blocker__(self, x, y, w):
+        """Get whatever is in the way of columns x to x + w in row y, if anything"""
+        row = self.rows.get(y)
+        if row is None:
+            return None
+        index = bisect.bisect_right(row[0], x) - 1
+        if index >= 0 and row[1][index][1] > x:
+            return row[1][index]
+        if index + 1 < len(row[1]) and row[1][index + 1][0] < x + w:
+            return row[1][index + 1]
+        return None
+
+    def collisions(self, x, y, w, h):
+        """Get the names of Tiles in the way of a `w` by `h` Tile at X/Y"""
+        found = []
+        for row in range(y, y + h):
+            start = x
+            while True:
+                blocker = self.__blocker__(start, row, x + w - start)
+                if blocker is None:
+                    break
+                if blocker[2] not in found:
+                    found.append(blocker[2])
+                start = blocker[1]
+                if start >= x + w:
+                    break
+        return found
+
+    def add(self, name, x, y, w, h):
+        """Mark cells as taken by Tile `name`
+
+        Nothing is marked if the Tile would overlap another. Returns the names
+        of the Tiles it would overlap."""
+        found = self.collisions(x, y, w, h)
+        if found:
+            return found
+        for row in range(y, y + h):
+            starts, spans = self.rows.setdefault(row, ([], []))
+            index = bisect.bisect_left(starts, x)
+            starts.insert(index, x)
+            spans.insert(index, (x, x + w, name))
+        while self.__blocker__(self.cursor[0], self.cursor[1], 1) is not None:
+            if self.cursor[0] + 1 >= self.columns:
+                self.cursor = (0, self.cursor[1] + 1)
+            else:
+                self.cursor = (self.cursor[0] + 1, self.cursor[1])
+        return found
+
+    def find_free(self, w=1, h=1):
+        """Find the first free slot for a `w` by `h` Tile
+
+        Slots are looked for row by row, starting from the first free cell.
+        Returns its X/Y."""
+        columns = max(self.columns, w)
+        x, y = self.cursor
+        while True:
+            if x + w > columns:
+                x = 0
+                y += 1
+                continue
+            for row in range(y, y + h):
+                blocker = self.__blocker__(x, row, w)
+                if blocker is not None:
+                    # Nothing can fit before the end of what is in the way
+                    x = blocker[1]
+                    break
+            else:
+                return (x, y)
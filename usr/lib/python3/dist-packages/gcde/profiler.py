@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+#  profiler.py
+#
+#  Copyright 2020 Thomas Castleman <contact@draugeros.org>
+#
+#  This program is free software; you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation; either version 2 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software
+#  Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston,
+#  MA 02110-1301, USA.
+#
+#
+"""Startup profiler for GCDE
+
+Records how long each phase of startup takes, across both the launcher
+(`/usr/bin/gcde`) and the engine, and writes them out as a JSON report.
+Timestamps come from the system-wide monotonic clock, so phases from
+different processes can be lined up against each other.
+
+Recording is off unless enable() is called, in which case phase() and
+record() cost next to nothing.
+"""
+import os
+import json
+import time
+from contextlib import contextmanager
+import gcde.common as common
+
+REPORT_VERSION = 1
+# Set by the launcher so the engine adds to the same report
+REPORT_ENV = "GCDE_STARTUP_PROFILE"
+
+enabled = False
+report = None
+append_report = False
+process = None
+_phases = []
+
+
+def default_report():
+    """Get the default location for startup reports"""
+    return os.path.join(common.get_cache_dir(), "startup-profile.json")
+
+
+def enable(process_name, path=None):
+    """Start recording phases for `process_name`
+
+    If `path` is not given, phases are added to the report the launcher
+    started (if there is one), or else the default report."""
+    global enabled, report, process, append_report
+    enabled = True
+    process = process_name
+    if path is None:
+        append_report = os.getenv(REPORT_ENV) is not None
+        path = os.getenv(REPORT_ENV, default_report())
+    report = path
+
+
+@contextmanager
+def phase(name):
+    """Record how long the body of this `with` statement takes, as `name`"""
+    if not enabled:
+        yield
+        return
+    start = time.monotonic()
+    try:
+        yield
+    finally:
+        record(name, start, time.monotonic())
+
+
+def record(name, start, end=None):
+    """Record phase `name` as having run from `start` to `end`
+
+    If `end` is not given, the phase is taken to have just finished."""
+    if not enabled:
+        return
+    if end is None:
+        end = time.monotonic()
+    _phases.append({"process":process, "name":name, "start":start,
+                    "end":end, "duration":end - start})
+
+
+def mark(name):
+    """Record a point in time, such as the first frame being drawn"""
+    now = time.monotonic()
+    record(name, now, now)
+
+
+def save(append=None):
+    """Write out recorded phases, then stop recording
+
+    If `append` is True, phases already in the report are kept. By default,
+    that is only done when adding to a report the launcher started."""
+    global enabled
+    if not enabled:
+        return False
+    if append is None:
+        append = append_report
+    phases = []
+    if append:
+        try:
+            with open(report, "r") as file:
+                old = json.load(file)
+            if old["version"] == REPORT_VERSION:
+                phases = old["phases"]
+        except (FileNotFoundError, ValueError, KeyError):
+            pass
+    phases = sorted(phases + _phases, key=lambda each: each["start"])
+    total = 0
+    if phases:
+        total = max(each["end"] for each in phases) - phases[0]["start"]
+    with open(report + ".tmp", "w") as file:
+        json.dump({"version":REPORT_VERSION, "total":total,
+                   "phases":phases}, file, indent=1)
+    os.replace(report + ".tmp", report)
+    _phases.clear()
+    enabled = False
+    return False
@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+#  search.py
+#
+#  Copyright 2020 Thomas Castleman <contact@draugeros.org>
+#
+#  This program is free software; you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation; either version 2 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software
+#  Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston,
+#  MA 02110-1301, USA.
+#
+#
+"""Type-ahead search over application Menu entries
+
+SearchIndex is built once per catalog. It maps every substring of up to
+three characters in each entry's Name, GenericName, Keywords and Exec to the
+entries they come from, so a query only has to look at entries which can
+possibly match, rather than every installed application. Short and long
+queries both match anywhere in a word, so results don't come and go as the
+user types.
+"""
+import os
+
+# Substrings up to this long are indexed. Longer query words are looked up
+# by the substrings of this length in them
+MAX_GRAM = 3
+# How much a match in each field counts for when ranking results
+WEIGHTS = {"name":8, "generic name":4, "keywords":4, "exec":2}
+
+
+def _words(text):
+    """Split `text` into lower-case words"""
+    output = []
+    word = []
+    for each in text.lower():
+        if each.isalnum():
+            word.append(each)
+        elif word:
+            output.append("".join(word))
+            word = []
+    if word:
+        output.append("".join(word))
+    return output
+
+
+def _grams(word, length):
+    """Get the substrings of `word` which are `length` characters long"""
+    return {word[each:each + length] for each in range(len(word) - length + 1)}
+
+
+class SearchIndex():
+    """Substring index over a list of Menu entries"""
+    def __init__(self, entries):
+        """Index `entries`, a list of Menu entry dicts"""
+        self.entries = entries
+        self.fields = []
+        self.grams = {}
+        for index, entry in enumerate(entries):
+            fields = {"name":_words(entry.get("name") or ""),
+                      "generic name":_words(entry.get("generic name") or ""),
+                      "keywords":_words(" ".join(entry.get("keywords") or [])),
+                      "exec":[]}
+            if entry.get("exec"):
+                fields["exec"] = _words(os.path.basename(entry["exec"][0]))
+            self.fields.append(fields)
+            for words in fields.values():
+                for word in words:
+                    for length in range(1, min(len(word), MAX_GRAM) + 1):
+                        for each in _grams(word, length):
+                            self.grams.setdefault(each, set()).add(index)
+
+    def __candidates__(self, word):
+        """Get entries which may contain `word`"""
+        if len(word) <= MAX_GRAM:
+            return self.grams.get(word, set())
+        candidates = None
+        for each in _grams(word, MAX_GRAM):
+            found = self.grams.get(each, set())
+            if candidates is None:
+                candidates = set(found)
+            else:
+                candidates &= found
+            if not candidates:
+                break
+        return candidates
+
+    def __score__(self, index, words, query):
+        """Rank entry `index` against the words in a query
+
+        Returns 0 if the entry doesn't match every word"""
+        fields = self.fields[index]
+        total = 0
+        for word in words:
+            best = 0
+            for field, weight in WEIGHTS.items():
+                for each in fields[field]:
+                    if each == word:
+                        score = weight * 3
+                    elif each.startswith(word):
+                        score = weight * 2
+                    elif word in each:
+                        score = weight
+                    else:
+                        continue
+                    best = max(best, score)
+            if not best:
+                return 0
+            total += best
+        # Names starting with the whole query go first
+        if (self.entries[index].get("name") or "").lower().startswith(query):
+            total += 100
+        return total
+
+    def search(self, query, limit=None):
+        """Get indexes of entries matching `query`, best matches first"""
+        query = query.strip().lower()
+        words = _words(query)
+        if not words:
+            return list(range(len(self.entries)))
+        candidates = None
+        for word in words:
+            found = self.__candidates__(word)
+            if candidates is None:
+                candidates = set(found)
+            else:
+                candidates &= found
+            if not candidates:
+                return []
+        results = []
+        for index in candidates:
+            score = self.__score__(index, words, query)
+            if score:
+                results.append((-score, (self.entries[index].get("name") or "").lower(),
+                                index))
+        results.sort()
+        if limit is not None:
+            results = results[:limit]
+        return [each[2] for each in results]
@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+#  themes.py
+#
+#  Copyright 2020 Thomas Castleman <contact@draugeros.org>
+#
+#  This program is free software; you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation; either version 2 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software
+#  Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston,
+#  MA 02110-1301, USA.
+#
+#
+"""Catalog of installed GTK and icon themes
+
+Listing themes means listing every theme directory, then checking inside
+each theme. Instead of doing that every time the Settings view is built,
+the catalog is kept on disk, keyed on the mtime of each theme directory,
+so it is only re-scanned when a theme is installed or removed.
+"""
+import os
+import json
+from gi.repository import GLib
+import gcde.common as common
+import gcde.icons as icons
+
+CATALOG_VERSION = 1
+
+_catalog = None
+
+
+def _data_dirs():
+    """Get $XDG_DATA_HOME and $XDG_DATA_DIRS, most important first"""
+    dirs = [os.getenv("XDG_DATA_HOME") or os.path.join(os.getenv("HOME"),
+                                                       ".local/share")]
+    dirs += (os.getenv("XDG_DATA_DIRS") or "/usr/local/share:/usr/share").split(":")
+    dirs.append("/usr/share")
+    output = []
+    for each in dirs:
+        if each and each not in output:
+            output.append(each)
+    return output
+
+
+def get_theme_dirs():
+    """Get directories GTK themes are installed in, most important first"""
+    return ([os.path.join(os.getenv("HOME"), ".themes")] +
+            [os.path.join(each, "themes") for each in _data_dirs()])
+
+
+def get_icon_theme_dirs():
+    """Get directories icon themes are installed in, most important first"""
+    return ([os.path.join(os.getenv("HOME"), ".icons")] +
+            [os.path.join(each, "icons") for each in _data_dirs()])
+
+
+def _stamps(dirs):
+    """Get what the catalog is keyed on for each of `dirs`"""
+    stamps = {}
+    for each in dirs:
+        try:
+            stamps[each] = os.stat(each).st_mtime_ns
+        except OSError:
+            stamps[each] = None
+    return stamps
+
+
+def _list(dirs, check):
+    """List themes in `dirs` for which `check(path)` is True"""
+    themes = []
+    for directory in dirs:
+        try:
+            entries = os.scandir(directory)
+        except OSError:
+            continue
+        with entries:
+            for each in entries:
+                if ((each.name not in themes) and
+                        ("default" not in each.name.lower()) and
+                        each.is_dir() and check(each.path)):
+                    themes.append(each.name)
+    return sorted(themes, key=str.lower)
+
+
+def scan(version="3.0"):
+    """Scan for installed themes, for GTK `version`"""
+    theme_dirs = get_theme_dirs()
+    icon_dirs = get_icon_theme_dirs()
+    gtk = "gtk-" + version
+    return {"version":CATALOG_VERSION,
+            "gtk version":version,
+            "stamps":_stamps(theme_dirs + icon_dirs),
+            "gtk":_list(theme_dirs,
+                        lambda path: os.path.isdir(os.path.join(path, gtk))),
+            "icons":_list(icon_dirs,
+                          lambda path: os.path.isfile(os.path.join(path,
+                                                                   "index.theme")))}
+
+
+def _valid(catalog, version):
+    """Check whether `catalog` is still up to date"""
+    return ((catalog is not None) and
+            (catalog.get("version") == CATALOG_VERSION) and
+            (catalog.get("gtk version") == version) and
+            (catalog.get("stamps") == _stamps(get_theme_dirs() +
+                                              get_icon_theme_dirs())))
+
+
+def get_catalog(version="3.0"):
+    """Get installed themes, as {"gtk": [...], "icons": [...]}
+
+    Only re-scans if a theme directory changed since the catalog was made."""
+    global _catalog
+    if _valid(_catalog, version):
+        return _catalog
+    path = os.path.join(common.get_cache_dir(), "themes.json")
+    try:
+        with open(path, "r") as file:
+            _catalog = json.load(file)
+    except (OSError, ValueError):
+        _catalog = None
+    if _valid(_catalog, version):
+        return _catalog
+    _catalog = scan(version)
+    try:
+        with open(path + ".tmp", "w") as file:
+            json.dump(_catalog, file)
+        os.replace(path + ".tmp", path)
+    except OSError:
+        pass
+    return _catalog
+
+
+def get_catalog_async(callback, *args, version="3.0"):
+    """Get installed themes in the background
+
+    `callback(catalog, *args)` is called from the GLib main loop once they
+    are ready."""
+    future = icons.get_pool().submit(get_catalog, version)
+    future.add_done_callback(lambda done: GLib.idle_add(_deliver, done,
+                                                        callback, args))
+
+
+def _deliver(future, callback, args):
+    """Hand a catalog from get_catalog_async() to its callback"""
+    try:
+        catalog = future.result()
+    except OSError as error:
+        common.eprint("WARNING: Could not list themes: %s" % (error))
+        catalog = {"gtk":[], "icons":[]}
+    callback(catalog, *args)
+    return False
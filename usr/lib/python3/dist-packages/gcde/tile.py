@@ -24,35 +24,128 @@
 """Tile Object library to create tiles with different functions on GCDE"""
 import gi
 gi.require_version('Gtk', '3.0')
-from gi.repository import Gtk, Gdk, GdkPixbuf
-from subprocess import Popen
+from gi.repository import Gtk, Gdk
 import gcde.common as common
+import gcde.icons as icons
+import gcde.launcher as launcher
+
+
+# Settings every Tile has, in the order TileSpec keeps them
+FIELDS = ("exec", "icon", "name", "X", "Y", "width", "height")
+
+
+class TileSpec():
+    """Settings for a single Tile, without any GTK objects
+
+    TileSpecs are small enough to keep one around for every Tile GCDE might
+    show, such as every entry in the Menu. They can be used like the settings
+    dictionaries they are made from. Settings which aren't in FIELDS are kept
+    in a dictionary of their own, which is only made if needed."""
+    __slots__ = FIELDS + ("extra",)
+
+    def __init__(self, settings=None):
+        """Make a TileSpec, with `settings` in place of the defaults"""
+        self.exec = []
+        self.icon = None
+        self.name = "Name"
+        self.X = 0
+        self.Y = 0
+        self.width = 0.1
+        self.height = 0.1
+        self.extra = None
+        if settings is not None:
+            for each in settings:
+                self[each] = settings[each]
+
+    def __getitem__(self, key):
+        if key in FIELDS:
+            return getattr(self, key)
+        if self.extra is None:
+            raise KeyError(key)
+        return self.extra[key]
+
+    def __setitem__(self, key, value):
+        if key in FIELDS:
+            setattr(self, key, value)
+        else:
+            if self.extra is None:
+                self.extra = {}
+            self.extra[key] = value
+
+    def __contains__(self, key):
+        return (key in FIELDS) or ((self.extra is not None) and (key in self.extra))
+
+    def __iter__(self):
+        yield from FIELDS
+        if self.extra is not None:
+            yield from self.extra
+
+    def __len__(self):
+        return len(FIELDS) + (len(self.extra) if self.extra is not None else 0)
+
+    def __repr__(self):
+        return "TileSpec(%r)" % (self.to_dict())
+
+    def get(self, key, default=None):
+        """Get setting `key`, or `default` if it isn't set"""
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def keys(self):
+        """Get the names of every setting"""
+        return list(self)
+
+    def to_dict(self):
+        """Get these settings as a dictionary"""
+        return {each:self[each] for each in self}
 
 
 class Tile():
-    """Tile object for GCDE"""
+    """Tile object for GCDE
+
+    A Tile's GTK widget isn't made until something needs it (normally, when
+    the Tile is placed), so Tiles which are never shown cost little more than
+    their TileSpec."""
+    widget = None
+    icon_size = None
+
     def __init__(self):
         """Intialize the Tile"""
-        self.settings = {"exec":[],
-                         "icon":None,
-                         "name":"Name",
-                         "X":0,
-                         "Y":0,
-                         "width":0.1,
-                         "height":0.1}
-        self.obj = Gtk.Button.new()
-        self.obj.set_always_show_image(True)
+        self.settings = TileSpec()
+
+    @property
+    def obj(self):
+        """This Tile's GTK widget, made the first time it is needed"""
+        if self.widget is None:
+            self.widget = Gtk.Button.new()
+            self.widget.set_always_show_image(True)
+        return self.widget
+
+    @obj.setter
+    def obj(self, widget):
+        self.widget = widget
 
     def __set_settings__(self, new_settings: dict):
         """Set inital settings for a Tile object"""
         for each in new_settings:
             self.settings[each] = new_settings[each]
-        print("Set settings for : %s " % (new_settings["name"]))
 
     def change_setting(self, setting_key: str, setting_value):
         """Change an individual setting for an indivdual tile"""
         self.settings[setting_key] = setting_value
 
+    def rebind(self, new_settings: dict):
+        """Re-use this Tile for different settings
+
+        Only the command, icon and name are taken from `new_settings`.
+        Position and size are kept. Call make() afterwards to update the
+        Tile's label and icon."""
+        for each in ("exec", "icon", "name"):
+            if each in new_settings:
+                self.settings[each] = new_settings[each]
+
     def get_settings(self):
         """Get settings for a specific tile
 
@@ -63,24 +156,10 @@ class Tile():
         """Define Tile drawing properties"""
         if global_settings["names"] is True:
             self.obj.set_label(self.settings["name"])
-        icon_theme = Gtk.IconTheme.get_default()
-        icon_info = icon_theme.lookup_icon(self.settings["icon"], 48, 0)
-        image = GdkPixbuf.Pixbuf()
-        try:
-            image = image.new_from_file_at_scale(icon_info.get_filename(),
-                                                 global_settings["icon size"],
-                                                 global_settings["icon size"],
-                                                 False)
-        except AttributeError:
-            icon_theme = Gtk.IconTheme.get_default()
-            icon_info = icon_theme.lookup_icon("unknown", 48, 0)
-            image = GdkPixbuf.Pixbuf()
-            image = image.new_from_file_at_scale(icon_info.get_filename(),
-                                                 global_settings["icon size"],
-                                                 global_settings["icon size"],
-                                                 False)
-        image = Gtk.Image.new_from_pixbuf(image)
-        self.obj.set_image(image)
+        elif self.obj.get_label():
+            # Names were turned off since this Tile was last made
+            self.obj.set_label("")
+        self.refresh_icon(int(global_settings["icon size"]))
         self.obj.set_image_position(Gtk.PositionType.TOP)
         self.obj.set_margin_top(common.scale(0.0073, height))
         self.obj.set_margin_bottom(common.scale(0.0073, height))
@@ -91,6 +170,41 @@ class Tile():
         # for that capability.
         # self.obj.set_opacity(global_settings["blur"])
 
+    def refresh_icon(self, size):
+        """Show this Tile's icon at `size`, without touching the rest of the Tile
+
+        Used when the icon theme or icon size changes. Icons are decoded in
+        the background. Until this Tile's icon is ready, it shows a
+        placeholder."""
+        if not hasattr(self.obj, "set_image"):
+            # Plugin Tiles may not be buttons at all
+            return
+        self.icon_size = size
+        image = icons.load_icon_async(self.settings["icon"], size,
+                                      self.__icon_loaded__,
+                                      self.settings["icon"], size)
+        if image is None:
+            image = Gtk.Image.new_from_icon_name("image-loading",
+                                                 Gtk.IconSize.DIALOG)
+            image.set_pixel_size(size)
+        else:
+            image = Gtk.Image.new_from_pixbuf(image)
+        self.obj.set_image(image)
+
+    def __icon_loaded__(self, pixbuf, icon, size):
+        """Swap the placeholder for this Tile's icon, once it is loaded"""
+        # The Tile may have been re-bound to another icon, or changed size,
+        # in the meantime
+        if (self.settings["icon"] == icon) and (self.icon_size == size):
+            self.obj.set_image(Gtk.Image.new_from_pixbuf(pixbuf))
+
+    def get_icon(self, size):
+        """Get this Tile's icon as a pixbuf, scaled to `size` x `size`
+
+        Icons are shared through GCDE's icon cache, so Tiles (including
+        plugin Tiles) should use this rather than loading icons themselves."""
+        return icons.load_icon(self.settings["icon"], size)
+
     def __get_internal_obj__(self):
         """Get internal GTK Object for Tile
 
@@ -99,18 +213,26 @@ class Tile():
                 self.settings["width"], self.settings["height"])
 
     def run(self, widget):
-        """Execute Click action"""
-        Popen(self.settings["exec"])
+        """Execute Click action
+
+        The launch happens once GTK is idle, so the click isn't held up.
+        Field codes are only expanded for Tiles with the "field codes"
+        setting, which is set on Tiles made from .desktop files."""
+        argv = self.settings["exec"]
+        if self.settings.get("field codes"):
+            argv = launcher.expand_field_codes(argv, icon=self.settings["icon"],
+                                               name=self.settings["name"])
+        launcher.launch(argv)
 
 
 def new(settings: dict):
     """Make a new tile with the settings in the `settings` list.
 
     This is meant to normally be used by the GCDE engine to initalize and
-    configure a tile
+    configure a tile. `settings` may be a dictionary, or a TileSpec.
     """
     obj = Tile()
-    obj.__set_settings__(new_settings=settings)
+    obj.settings = TileSpec(settings)
     return obj
 
 
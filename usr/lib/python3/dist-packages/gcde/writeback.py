@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+#  writeback.py
+#
+#  Copyright 2020 Thomas Castleman <contact@draugeros.org>
+#
+#  This program is free software; you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation; either version 2 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software
+#  Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston,
+#  MA 02110-1301, USA.
+#
+#
+"""Atomic, write-only-if-changed file updates
+
+write_if_changed() never rewrites a file that already has the contents
+asked for, and writes to a temporary file which is then renamed into
+place, so a crash part way through never leaves a file half written.
+
+WriteBack batches writes: files queued with it are only written once
+changes have stopped coming in for a moment, so toggling a setting back
+and forth quickly is a single write, or none at all.
+"""
+import os
+import atexit
+from gi.repository import GLib
+
+# How long to wait for more changes before writing, in milliseconds
+DELAY = 500
+
+
+def read(path):
+    """Get the contents of `path`, or None if it doesn't exist"""
+    try:
+        with open(path, "r") as file:
+            return file.read()
+    except FileNotFoundError:
+        return None
+
+
+def write_if_changed(path, data):
+    """Atomically write `data` to `path`, only if it isn't there already
+
+    Returns whether the file was written."""
+    if read(path) == data:
+        return False
+    tmp = "%s.%s.tmp" % (path, os.getpid())
+    try:
+        with open(tmp, "w") as file:
+            file.write(data)
+            file.flush()
+            os.fsync(file.fileno())
+        # Keep the permissions of the file being replaced
+        try:
+            os.chmod(tmp, os.stat(path).st_mode & 0o7777)
+        except FileNotFoundError:
+            pass
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            os.remove(tmp)
+        except FileNotFoundError:
+            pass
+        raise
+    return True
+
+
+class WriteBack():
+    """Queue of file writes, flushed once changes stop coming in"""
+    def __init__(self, delay=DELAY):
+        self.delay = delay
+        self.pending = {}
+        self.writes = 0
+        self.skipped = 0
+        self.__timeout__ = None
+        atexit.register(self.flush)
+
+    def read(self, path):
+        """Get the contents of `path`, including any changes not written yet"""
+        if path in self.pending:
+            return self.pending[path]
+        return read(path)
+
+    def queue(self, path, data):
+        """Write `data` to `path` soon, replacing any write already queued"""
+        self.pending[path] = data
+        if self.__timeout__ is not None:
+            GLib.source_remove(self.__timeout__)
+        self.__timeout__ = GLib.timeout_add(self.delay, self.__flush__)
+
+    def __flush__(self):
+        """Flush once changes have stopped, as a GLib timeout"""
+        self.__timeout__ = None
+        self.flush()
+        return False
+
+    def flush(self):
+        """Write every queued file now"""
+        if self.__timeout__ is not None:
+            GLib.source_remove(self.__timeout__)
+            self.__timeout__ = None
+        pending = self.pending
+        self.pending = {}
+        for path in pending:
+            if write_if_changed(path, pending[path]):
+                self.writes += 1
+            else:
+                self.skipped += 1
+
+    def stats(self):
+        """Get how many files were written, and how many didn't need to be"""
+        return {"pending":len(self.pending), "writes":self.writes,
+                "skipped":self.skipped}
+
+
+_writeback = None
+
+
+def get_writeback():
+    """Get GCDE's shared WriteBack"""
+    global _writeback
+    if _writeback is None:
+        _writeback = WriteBack()
+    return _writeback
@@ -22,17 +22,20 @@
 #
 #
 """Engine for GCDE"""
+import time
+STARTED = time.monotonic()
 GTK_VERSION = "3.0"
 import os
 import json
 import copy
-import shlex
-import multiprocessing
+import itertools
 import sys
-from subprocess import check_output, Popen
+import signal
+import atexit
 import gi
 gi.require_version('Gtk', GTK_VERSION)
-from gi.repository import Gtk, Pango
+gi.require_version('Gdk', GTK_VERSION)
+from gi.repository import Gtk, Gdk, GLib, Pango
 import cairo
 import gcde
 import plugins
@@ -58,24 +61,36 @@ else:
     debug = False
     res_override = False
 
+if ("--profile-startup" in sys.argv) or ("-p" in sys.argv):
+    gcde.profiler.enable("engine")
+    gcde.profiler.record("imports", STARTED)
+
 
 # Define configuration location
 home = os.getenv("HOME")
 if home[-1] != "/":
     home = home + "/"
-local_settings = home + ".config/gcde/global_settings.json"
-local_tiles = home + ".config/gcde/tiles.json"
-global_settings = "/etc/gcde/defaults-global.json"
-global_tiles = "/etc/gcde/default-tiles.json"
 themes_file = home + ".config/gtk-3.0/settings.ini"
 
+
+def get_monitor_geometry():
+    """Get the geometry of the primary monitor, straight from GDK"""
+    display = Gdk.Display.get_default()
+    monitor = display.get_primary_monitor()
+    if monitor is None:
+        monitor = display.get_monitor(0)
+    return monitor.get_geometry()
+
+
 # Get screen resolution for proper scaling
+origin = (0, 0)
 if not res_override:
-    results = check_output(['xrandr']).decode().split("current")[1].split(",")[0]
-    width = results.split("x")[0].strip()
-    height = results.split("x")[1].strip()
-    width = int(width)
-    height = int(height)
+    with gcde.profiler.phase("resolution"):
+        geometry = get_monitor_geometry()
+    origin = (geometry.x, geometry.y)
+    width = geometry.width
+    height = geometry.height
+    del geometry
 
 # Make config dir
 try:
@@ -84,110 +99,71 @@ except FileExistsError:
     pass
 
 
-def get_tiles():
-    """Get tile configurations, global or local"""
-    if os.path.exists(local_tiles):
-        with open(local_tiles, "r") as file:
-            return json.load(file)
-    with open(global_tiles, "r") as file:
-        # shutil.copy(global_tiles, local_tiles)
-        return json.load(file)
-
+def index_tiles(tiles):
+    """Index where every Tile in `tiles` is, moving any which overlap
 
-def launch_autostarters():
-    """Launch Autostart apps"""
-    prefix = home + ".config/autostart/"
-    file_list = os.listdir(prefix)
-    for each in file_list:
-        skip = False
-        with open(prefix + each, "r") as file:
-            data = file.read().split("\n")
-        for each1 in data:
-            if each1 == "X-GNOME-Autostart-enabled=false":
-                skip = True
-                break
-        if skip:
+    A Tile which overlaps one before it is moved to the first free slot big
+    enough for it."""
+    keys = ("X", "Y", "width", "height")
+    placed = [each for each in tiles.values() if all(key in each for key in keys)]
+    columns = max([int(each["X"] + each["width"]) for each in placed] + [1])
+    occupancy = gcde.layout.Occupancy(columns)
+    for name in tiles:
+        if not all(key in tiles[name] for key in keys):
             continue
-        for each1 in data:
-            if each1[:5] == "Exec=":
-                execute = shlex.split(each1[5:])
-                break
-        subprocess.Popen(execute)
-    for each in file_list:
-        skip = False
-        with open(prefix + each, "r") as file:
-            data = file.read()
-        if "X-GNOME-Autostart-enabled=" not in data:
-            data = data.split("\n")
-            data.append("X-GNOME-Autostart-enabled=false")
-            data = "\n".join(data)
-        os.remove(prefix + each)
-        with open(prefix + each, "w") as file:
-            file.write(data)
+        loc = tiles[name]
+        w = max(int(loc["width"]), 1)
+        h = max(int(loc["height"]), 1)
+        found = occupancy.add(name, int(loc["X"]), int(loc["Y"]), w, h)
+        if found:
+            loc["X"], loc["Y"] = occupancy.find_free(w, h)
+            gcde.common.eprint("Tile %s overlaps %s, moving it to %s, %s" % (name,
+                                                                            ", ".join(found),
+                                                                            loc["X"],
+                                                                            loc["Y"]))
+            occupancy.add(name, loc["X"], loc["Y"], w, h)
+    return occupancy
 
 
 def autostart_enabled(path):
     """Get whether autostart is enabled for a file"""
-    with open(path, "r") as file:
-        data = file.read().split("\n")
-    for each in enumerate(data):
-        if "X-GNOME-Autostart-enabled" in data[each[0]]:
-            data[each[0]] = data[each[0]].split("=")
-            if data[each[0]][1] == "false":
-                return False
-            return True
-    data.append("X-GNOME-Autostart-enabled=false")
-    data = "\n".join(data)
-    os.remove(path)
-    with open(path, "w") as file:
-        file.write(data)
-    return False
-
-
-
-def toggle_autostart(path):
-    """Toggle Autostart setting"""
-    with open(path, "r") as file:
-        data = file.read().split("\n")
-    for each in enumerate(data):
-        if "X-GNOME-Autostart-enabled" in data[each[0]]:
-            data[each[0]] = data[each[0]].split("=")
-            if data[each[0]][1] == "false":
-                data[each[0]][1] = "true"
-            else:
-                data[each[0]][1] = "false"
-            data[each[0]] = "=".join(data[each[0]])
-    data = "\n".join(data)
-    os.remove(path)
-    with open(path, "w") as file:
-        file.write(data)
+    data = gcde.writeback.get_writeback().read(path)
+    if data is None:
+        # The file was deleted
+        return False
+    return gcde.desktop.parse_string(data, path=path).autostart_enabled is True
+
+
+def toggle_autostart(path, enabled=None):
+    """Toggle Autostart setting, or set it to `enabled`
+
+    The file is written once toggling stops, and only if it changed"""
+    writeback = gcde.writeback.get_writeback()
+    data = writeback.read(path)
+    if data is None:
+        # The file was deleted, so there is nothing left to toggle
+        return
+    if enabled is None:
+        enabled = not autostart_enabled(path)
+    writeback.queue(path, gcde.desktop.set_key(data, "X-GNOME-Autostart-enabled",
+                                               "true" if enabled else "false"))
 
 
 def desktop_to_json(path, x, y, w, h, extra_key="Hidden="):
     """Convert Desktop file to GCDE Tile Json"""
-    hidden = (extra_key, len(extra_key))
-    with open(path, "r") as file:
-        data = file.read().split("\n")
-    for each in range(len(data) - 1, -1, -1):
-        if data[each] == "":
-            del data[each]
-    if len(data) < 4:
+    entry = gcde.desktop.parse(path)
+    if entry.name is None:
         return {}
-    tile_settings = {}
-    for each in data:
-        if each[:5] == "Name=":
-            tile_settings["name"] = each[5:]
-        elif each[:5] == "Icon=":
-            tile_settings["icon"] = each[5:]
-        elif each[:hidden[1]] == hidden[0]:
-            if each[hidden[1]:] == "true":
-                tile_settings["hidden"] = True
-            else:
-                tile_settings["hidden"] = False
-        elif each[:5] == "Exec=":
-            tile_settings["execute"] = shlex.split(each[5:])
-    if "hidden" not in tile_settings:
-        tile_settings["hidden"] = False
+    key = extra_key.rstrip("=")
+    if key in gcde.desktop.BOOLEAN_KEYS:
+        hidden = getattr(entry, gcde.desktop.BOOLEAN_KEYS[key]) is True
+    else:
+        hidden = False
+    tile_settings = {"name":entry.name, "hidden":hidden}
+    if entry.icon is not None:
+        tile_settings["icon"] = entry.icon
+    if entry.exec is not None:
+        tile_settings["execute"] = entry.exec
     tile_settings["X"] = x
     tile_settings["Y"] = y
     tile_settings["width"] = w
@@ -200,69 +176,385 @@ class Matrix(Gtk.Window):
     def __init__(self):
         """Make the Matrix"""
         Gtk.Window.__init__(self, title="GTK+ Console Desktop Environment")
-        self.grid = Gtk.Grid(orientation=Gtk.Orientation.VERTICAL)
-        self.grid.set_column_homogeneous(True)
-        self.grid.set_row_homogeneous(True)
-        self.grid.set_column_spacing(1)
-        self.grid.set_row_spacing(1)
-        self.add(self.grid)
-        self.settings = gcde.common.get_settings(local_settings)
-        self.tiles = get_tiles()
-        self.scrolling = False
+        # Each view (main Matrix, Menu, Settings, etc) is built once into its
+        # own grid and kept in this stack, so switching views is just a
+        # matter of changing which one is visible
+        self.stack = Gtk.Stack()
+        self.stack.set_transition_type(Gtk.StackTransitionType.NONE)
+        self.add(self.stack)
+        self.views = {}
+        self.builders = {"main":self.__build_main__,
+                         "menu":self.__build_menu__,
+                         "settings":self.__build_settings__,
+                         "session":self.__build_session__,
+                         "autostart":self.__build_autostart__}
+        self.grid = None
+        # Config changes are applied to the running Matrix, rather than
+        # needing a restart
+        self.config = gcde.config.Watcher()
+        self.config.connect(self.__config_changed__)
+        with gcde.profiler.phase("settings"):
+            self.settings = gcde.common.Settings(self.config.load("settings"))
+        with gcde.profiler.phase("tiles"):
+            # The Watcher's copy is compared against on every change, so
+            # only ever move Tiles around in our own copy
+            self.tiles_config = self.config.load("tiles")
+            self.tiles = copy.deepcopy(self.tiles_config)
+            self.occupancy = index_tiles(self.tiles)
+        self.building = None
+        self.view_tiles = {}
+        self.main_tiles = {}
+        self.first_frame = False
         self.background_launched = False
-
-        self.reboot = {"exec":["reboot"],
-                       "icon":"system-reboot", "name":"Reboot", "X":0, "Y":2,
-                       "width":int(width / 4), "height":1}
-        self.log_out = {"exec":["logout"],
-                        "icon":"system-log-out", "name":"Log Out",
-                        "X":int(width / 4), "Y":2, "width":int(width / 4),
-                        "height":1}
-        self.shutdown = {"exec":["poweroff"],
-                         "icon":"gnome-shutdown",
-                         "name":"Shutdown",
-                         "X":int(width / 4) * 2,
-                         "Y":2, "width":int(width / 4),
-                         "height":1}
-        self.back = {"exec":["main"],
-                     "icon":"application-exit",
-                     "name":"Back",
-                     "X":int(width / 4) * 3,
-                     "Y":2,
-                     "width":int(width / 4),
-                     "height":1}
-        self.back = gcde.tile.new(self.back)
-        self.reboot = gcde.tile.new(self.reboot)
-        self.poweroff = gcde.tile.new(self.shutdown)
-        self.log_out = gcde.tile.new(self.log_out)
-
+        self.menu_loader = None
+        self.menu_pool = None
+        self.menu_entries = []
+        self.menu_adjustment = None
+        # First entry the virtualized Menu's Tiles are bound to
+        self.menu_start = None
+        self.menu_tiles = {}
+        self.menu_results = []
+        self.menu_search = None
+        self.menu_search_entry = None
+        self.pending = []
+        self.connect("scroll-event", self.__menu_event__)
+        self.connect("key-press-event", self.__menu_event__)
+        self.add_events(Gdk.EventMask.SCROLL_MASK |
+                        Gdk.EventMask.SMOOTH_SCROLL_MASK)
+        self.catalog = None
+        self.menu_applications = None
+        self.menu_version = None
+        self.autostart_stamp = None
+        self.control = None
+        self.__start_control__()
+        # Icons follow the icon theme, however it gets changed
+        Gtk.Settings.get_default().connect("notify::gtk-icon-theme-name",
+                                           self.__refresh_icons__)
+
+        # Autostart entries are launched a few at a time, and most wait for
+        # the Matrix to be drawn first
+        self.autostart = None
         if not debug:
-            Popen(["/usr/bin/wmctrl", "-n", "1"])
-            proc = multiprocessing.Process(target=launch_autostarters)
-            proc.start()
+            gcde.launcher.launch(["/usr/bin/wmctrl", "-n", "1"])
+            autostart = self.settings.get("autostart", {})
+            self.autostart = gcde.autostart.Scheduler(autostart.get("concurrency", 2),
+                                                      autostart.get("settle time", 2))
+            self.autostart.start(gcde.autostart.load_entries(home + ".config/autostart/"))
 
         self.main("clicked")
 
-    def make_scrolling(self, widget):
-        """Make current window scroll"""
-        self.scrolling = True
-
-        self.remove(self.grid)
-
-        self.scrolled_window = Gtk.ScrolledWindow()
-        self.scrolled_window.set_border_width(10)
-        # there is always the scrollbar (otherwise: AUTOMATIC -
-        # only if needed
-        # - or NEVER)
-        self.scrolled_window.set_policy(Gtk.PolicyType.AUTOMATIC,
-                                        Gtk.PolicyType.AUTOMATIC)
-        self.add(self.scrolled_window)
-        # self.scrolled_window.add_with_viewport(self.grid)
-        self.scrolled_window.add(self.grid)
+        # Relayout when monitors are plugged in or unplugged (such as docking
+        # a handheld to a TV), unless the resolution was set by hand
+        self.relayout_source = None
+        if not res_override:
+            screen = self.get_screen()
+            screen.connect("monitors-changed", self.__monitors_changed__)
+            screen.connect("size-changed", self.__monitors_changed__)
+
+        # Build the Menu while we would otherwise be idle, so the first time
+        # it is opened is as quick as every other time
+        if self.settings["menu"].get("prebuild", True):
+            GLib.idle_add(self.__prebuild__, "menu")
+
+    def __monitors_changed__(self, *args):
+        """Schedule a relayout, once monitors have finished changing"""
+        if self.relayout_source is None:
+            self.relayout_source = GLib.idle_add(self.relayout)
+
+    def relayout(self):
+        """Resize the Matrix to fit the primary monitor, rebuilding views"""
+        global width, height, origin
+        self.relayout_source = None
+        geometry = get_monitor_geometry()
+        if ((geometry.x, geometry.y) == origin and geometry.width == width
+                and geometry.height == height):
+            return False
+        origin = (geometry.x, geometry.y)
+        width = geometry.width
+        height = geometry.height
+        self.move(origin[0], origin[1])
+        self.set_size_request(width, height)
+        self.resize(width, height)
+        visible = self.stack.get_visible_child_name()
+        self.invalidate_view()
+        if visible is not None:
+            self.show_view(visible)
+        return False
+
+    def reload(self, view=None):
+        """Reload config and rebuild every view, without restarting GCDE
+
+        Caches (such as icons and applications) are kept warm. Afterwards,
+        `view` is shown, or whichever view was showing before."""
+        if view is None:
+            view = self.stack.get_visible_child_name()
+        self.settings = gcde.common.Settings(self.config.load("settings"),
+                                             self.settings.version + 1)
+        self.tiles_config = self.config.load("tiles")
+        self.tiles = copy.deepcopy(self.tiles_config)
+        self.occupancy = index_tiles(self.tiles)
+        try:
+            theming = get_theming_defaults()
+        except FileNotFoundError:
+            theming = {}
+        gtk_settings = Gtk.Settings.get_default()
+        for each in ("gtk-theme-name", "gtk-icon-theme-name"):
+            if each in theming:
+                gtk_settings.set_property(each, theming[each])
+        self.invalidate_view()
+        self.show_view(view if view is not None else "main")
+        if self.settings["menu"].get("prebuild", True):
+            GLib.idle_add(self.__prebuild__, "menu")
+
+    def __start_control__(self):
+        """Listen for commands from scripts and the controller handler"""
+        commands = {"ping":lambda: "pong",
+                    "show-view":self.__control_show_view__,
+                    "reload-config":self.__control_reload__,
+                    "launch-tile":self.__control_launch_tile__,
+                    "dump-stats":self.dump_stats}
+        try:
+            self.control = gcde.control.ControlServer(commands)
+        except OSError as error:
+            gcde.common.eprint("WARNING: Could not open control socket: %s" % (error))
+            return
+        atexit.register(self.control.close)
+
+    def __control_show_view__(self, name):
+        """Show view `name`, for the control socket"""
+        if name not in self.builders:
+            raise ValueError("no such view: %s" % (name))
+        if name == "menu":
+            self.menu(None)
+        else:
+            self.show_view(name)
+        return name
+
+    def __control_reload__(self):
+        """Reload GCDE, for the control socket"""
+        self.reload()
+        return self.settings.version
+
+    def __control_launch_tile__(self, name):
+        """Click Tile `name` in the main Matrix, for the control socket"""
+        self.__build_view__("main")
+        if name not in self.main_tiles:
+            raise KeyError("no such Tile: %s" % (name))
+        self.main_tiles[name].obj.clicked()
+        return name
+
+    def dump_stats(self):
+        """Get statistics about the running Matrix"""
+        return {"pid":os.getpid(),
+                "uptime":time.monotonic() - STARTED,
+                "resolution":[width, height],
+                "settings version":self.settings.version,
+                "visible view":self.stack.get_visible_child_name(),
+                "views":sorted(self.views),
+                "tiles":{name:len(self.view_tiles[name]) for name in self.view_tiles},
+                "menu tiles":len(self.menu_tiles),
+                "applications":(len(self.menu_applications)
+                                 if self.menu_applications is not None else None),
+                "icon cache":gcde.icons.cache.stats(),
+                "autostart":(self.autostart.stats()
+                             if self.autostart is not None else None),
+                "write-back":gcde.writeback.get_writeback().stats(),
+                "launcher":gcde.launcher.stats(),
+                "control requests":(self.control.requests
+                                    if self.control is not None else 0)}
+
+    def __sighup__(self):
+        """Reload GCDE when sent SIGHUP"""
+        self.reload()
+        return True
+
+    def __sigterm__(self):
+        """Quit cleanly when sent SIGTERM
+
+        Leaving the main loop lets atexit handlers run, so queued writes are
+        flushed and the pidfile is removed."""
+        Gtk.main_quit()
+        return False
+
+    def __config_changed__(self, name, data):
+        """Apply changed config `name` to the running Matrix"""
+        if name == "settings":
+            self.__apply_settings__(gcde.common.Settings(data,
+                                                         self.settings.version + 1))
+        elif name == "tiles":
+            self.__apply_tiles__(data)
+
+    def __apply_settings__(self, settings):
+        """Switch to new global settings, only updating what they affect"""
+        old = self.settings
+        self.settings = settings
+        rebuild = set()
+        if old["menu"] != settings["menu"]:
+            rebuild.update(("menu", "settings"))
+        if old["names"] != settings["names"]:
+            # Menu Tiles are rebuilt, rather than re-made, since most of
+            # them are usually not in view
+            rebuild.add("menu")
+            for name in self.view_tiles:
+                if name not in rebuild:
+                    for each in self.view_tiles[name]:
+                        each.make(self.settings, width, height)
+        elif old["icon size"] != settings["icon size"]:
+            self.__refresh_icons__()
+            if "settings" in self.views and "settings" not in rebuild:
+                self.icon_scaler.set_value(settings["icon size"])
+        for each in rebuild:
+            self.__rebuild_view__(each)
+
+    def __refresh_icons__(self, *args):
+        """Re-render every Tile's icon, after the icon theme or size changes
+
+        Nothing else about the Tiles is touched. Icons already decoded for
+        the new theme and size come straight from the icon cache."""
+        size = int(self.settings["icon size"])
+        tiles = itertools.chain(itertools.chain.from_iterable(self.view_tiles.values()),
+                                self.menu_tiles.values(),
+                                self.menu_pool if self.menu_pool is not None else ())
+        for each in tiles:
+            each.refresh_icon(size)
+
+    def __icon_size_released__(self, widget, event):
+        """Apply the icon size from the Settings view live, once the slider is let go
+
+        Sizes passed through while dragging are never applied, since each
+        new size means looking icons up in the theme again."""
+        size = self.icon_scaler.get_value()
+        if size != self.settings["icon size"]:
+            self.__apply_settings__(self.settings.replace({"icon size":size}))
+        return False
+
+    def __theme_chosen__(self, widget, setting):
+        """Apply a theme chosen in the Settings view live"""
+        theme = widget.get_active_id()
+        if theme is not None:
+            Gtk.Settings.get_default().set_property(setting, theme)
+
+    def __apply_tiles__(self, tiles):
+        """Switch to new Tile configs, only updating the Tiles they affect"""
+        old = self.tiles_config
+        self.tiles_config = tiles
+        changed = [each for each in set(old) | set(tiles)
+                   if old.get(each) != tiles.get(each)]
+        if len(changed) == 0:
+            return
+        # Slots given to plugin Tiles when the Matrix was built
+        plugin_slots = {each:self.tiles[each] for each in self.tiles
+                        if each not in old}
+        self.tiles = copy.deepcopy(tiles)
+        # Tiles which only had their icon or name changed can be updated in
+        # place. Anything else means the Matrix needs laying out again
+        for each in changed:
+            if ((each not in self.main_tiles) or (each not in tiles) or
+                    any(tiles[each].get(key) != old[each].get(key)
+                        for key in ("exec",) + gcde.config.POSITION_KEYS)):
+                self.occupancy = index_tiles(self.tiles)
+                self.__rebuild_view__("main")
+                return
+        self.tiles.update(plugin_slots)
+        self.occupancy = index_tiles(self.tiles)
+        for each in changed:
+            self.main_tiles[each].rebind(tiles[each])
+            self.main_tiles[each].make(self.settings, width, height)
+
+    def __rebuild_view__(self, name):
+        """Throw out view `name`, building it again straight away if it is showing"""
+        visible = self.stack.get_visible_child_name()
+        self.invalidate_view(name)
+        if visible == name:
+            self.show_view(name)
+
+    def __new_view__(self, name, scrolling=False, header=None):
+        """Start building view `name`, making the grid it will live in
+
+        If `header` is given, it is put above the grid, and doesn't scroll"""
+        self.building = name
+        self.view_tiles[name] = []
+        self.grid = Gtk.Grid(orientation=Gtk.Orientation.VERTICAL)
+        self.grid.set_column_homogeneous(True)
+        self.grid.set_row_homogeneous(True)
+        self.grid.set_column_spacing(1)
+        self.grid.set_row_spacing(1)
+        child = self.grid
+        if scrolling:
+            child = Gtk.ScrolledWindow()
+            child.set_border_width(10)
+            # there is always the scrollbar (otherwise: AUTOMATIC -
+            # only if needed
+            # - or NEVER)
+            child.set_policy(Gtk.PolicyType.AUTOMATIC,
+                             Gtk.PolicyType.AUTOMATIC)
+            child.add(self.grid)
+        if header is not None:
+            box = Gtk.Box(orientation=Gtk.Orientation.VERTICAL)
+            box.pack_start(header, False, False, 0)
+            box.pack_start(child, True, True, 0)
+            child = box
+        self.stack.add_named(child, name)
+        self.views[name] = self.grid
+
+    def __build_view__(self, name):
+        """Build view `name`, if it isn't already built"""
+        if name in self.views:
+            return
+        self.builders[name]()
+        self.__layout_view__(self.views[name])
+        self.stack.get_child_by_name(name).show_all()
+        if name == "menu" and self.menu_pool is not None:
+            # Pool Tiles past the end of the Menu need to be hidden again
+            self.menu_start = None
+            self.__scroll_menu__(self.menu_adjustment)
+
+    def show_view(self, name):
+        """Show view `name`, only building it if it isn't already built"""
+        self.__build_view__(name)
+        self.grid = self.views[name]
+        self.stack.set_visible_child_name(name)
+
+    def invalidate_view(self, name=None):
+        """Throw out view `name` (or every view), to be rebuilt when next shown"""
+        if name is None:
+            for each in list(self.views):
+                self.invalidate_view(each)
+            return
+        if name not in self.views:
+            return
+        if name == "menu":
+            if self.menu_loader is not None:
+                GLib.source_remove(self.menu_loader)
+                self.menu_loader = None
+            self.menu_pool = None
+            self.menu_entries = []
+            self.menu_adjustment = None
+            self.menu_start = None
+            self.menu_tiles = {}
+            self.menu_results = []
+            self.menu_search = None
+            self.menu_search_entry = None
+        child = self.stack.get_child_by_name(name)
+        self.stack.remove(child)
+        child.destroy()
+        del self.views[name]
+        self.view_tiles.pop(name, None)
+        if name == "main":
+            self.main_tiles = {}
+
+    def __prebuild__(self, name):
+        """Build view `name` ahead of time, without showing it
+
+        Used as a GLib idle callback"""
+        if name == "menu":
+            self.__refresh_menu__()
+        self.__build_view__(name)
+        if name == "menu":
+            GLib.idle_add(self.__index_menu__)
+        return False
 
     def main(self, widget):
-        self.clear_window()
-
         self.connect('destroy', Gtk.main_quit)
         self.connect('draw', self.make)
 
@@ -277,23 +569,58 @@ class Matrix(Gtk.Window):
 
     def session_manager(self, widget):
         """Basic Session Manager"""
-        self.clear_window()
+        self.show_view("session")
+
+    def __build_session__(self):
+        """Build the Session Manager view"""
+        self.__new_view__("session")
+
+        reboot = {"exec":["reboot"],
+                  "icon":"system-reboot", "name":"Reboot", "X":0, "Y":2,
+                  "width":1, "height":1}
+        log_out = {"exec":["logout"],
+                   "icon":"system-log-out", "name":"Log Out",
+                   "X":1, "Y":2, "width":1,
+                   "height":1}
+        shutdown = {"exec":["poweroff"],
+                    "icon":"gnome-shutdown",
+                    "name":"Shutdown",
+                    "X":2,
+                    "Y":2, "width":1,
+                    "height":1}
+        back = {"exec":["main"],
+                "icon":"application-exit",
+                "name":"Back",
+                "X":3,
+                "Y":2,
+                "width":1,
+                "height":1}
+        back = gcde.tile.new(back)
+        reboot = gcde.tile.new(reboot)
+        poweroff = gcde.tile.new(shutdown)
+        log_out = gcde.tile.new(log_out)
 
         title = Gtk.Label()
         title.set_markup("\n\tAre you sure?\t\n")
         title.override_font(Pango.FontDescription("Open Sans %s" % (gcde.common.scale(0.05,
                                                                                       height))))
-        self.grid.attach(title, 0, 0, width, 2)
+        self.__attach__(title, 0, 0, 4, 2)
 
-        self.__place_tile__(self.log_out, scale=False)
-        self.__place_tile__(self.reboot, scale=False)
-        self.__place_tile__(self.poweroff, scale=False)
-        self.__place_tile__(self.back, scale=False)
+        self.__place_tile__(log_out, scale=False)
+        self.__place_tile__(reboot, scale=False)
+        self.__place_tile__(poweroff, scale=False)
+        self.__place_tile__(back, scale=False)
 
-        self.show_all()
+        del title, log_out, reboot, shutdown, poweroff, back
 
     def make(self, widget, context):
         """Draw window background"""
+        if not self.first_frame:
+            self.first_frame = True
+            gcde.profiler.mark("first frame")
+            GLib.idle_add(gcde.profiler.save)
+            if self.autostart is not None:
+                GLib.idle_add(self.autostart.frame_drawn)
         context.set_source_rgba(0, 0, 0, 0)
         context.set_operator(cairo.OPERATOR_SOURCE)
         context.paint()
@@ -301,8 +628,12 @@ class Matrix(Gtk.Window):
 
 
     def tile(self, widget):
+        """Show the main Matrix"""
+        self.show_view("main")
+
+    def __build_main__(self):
         """Get Tiles to place into Matrix, then place them"""
-        self.clear_window()
+        self.__new_view__("main")
 
         plugin_list = dir(plugins)
         for each in range(len(plugin_list) - 1, -1, -1):
@@ -313,33 +644,46 @@ class Matrix(Gtk.Window):
         plug_objs = []
         for each in plugin_list:
             plug_new = getattr(plugins, each)
+            if ((each not in self.tiles) and (plug_new.PLUGIN_TYPE != 1) and
+                    hasattr(plug_new, "TILE_SIZE")):
+                self.tiles[each] = self.__free_slot__(each, *plug_new.TILE_SIZE)
             try:
-                if plug_new.PLUGIN_TYPE == 0:
-                    plug_objs.append(plug_new.plugin_setup(copy.deepcopy(self.tiles[each])))
-                elif plug_new.PLUGIN_TYPE == 1:
-                    plug_objs.append(plug_new.plugin_setup(copy.deepcopy(self.settings)))
-                elif plug_new.PLUGIN_TYPE >= 2:
-                    plug_objs.append(plug_new.plugin_setup({"loc":copy.deepcopy(self.tiles[each]),
-                                                            "global":copy.deepcopy(self.settings)}))
+                with gcde.profiler.phase("plugin: %s" % (each)):
+                    if plug_new.PLUGIN_TYPE == 0:
+                        plug_objs.append(plug_new.plugin_setup(dict(self.tiles[each])))
+                    elif plug_new.PLUGIN_TYPE == 1:
+                        plug_objs.append(plug_new.plugin_setup(self.settings))
+                    elif plug_new.PLUGIN_TYPE >= 2:
+                        plug_objs.append(plug_new.plugin_setup({"loc":dict(self.tiles[each]),
+                                                                "global":self.settings}))
             except KeyError:
                 continue
 
 
         for each in self.tiles:
             if ("tile" in each.lower()) or (each in ("session_manager", "menu", "settings")):
-                self.__place_tile__(gcde.tile.new(self.tiles[each]), scale=False)
+                self.main_tiles[each] = gcde.tile.new(self.tiles[each])
+                self.__place_tile__(self.main_tiles[each], scale=False)
         for each in plug_objs:
             self.__place_tile__(each, scale=False)
 
         del plug_objs, plugin_list, each
 
-        self.show_all()
+    def __free_slot__(self, name, w, h):
+        """Give Tile `name` the first free `w` by `h` slot in the Matrix"""
+        x, y = self.occupancy.find_free(w, h)
+        self.occupancy.add(name, x, y, w, h)
+        return {"X":x, "Y":y, "width":w, "height":h}
 
-    def __place_tile__(self, tile, scale=True):
-        """Place tile in matrix"""
-        tile.make(copy.deepcopy(self.settings), width, height)
-        tile_obj = tile.__get_internal_obj__()
+    def __place_tile__(self, tile, scale=True, grid=None):
+        """Place tile in matrix
+
+        Tiles are queued for the view currently being built, unless `grid` is
+        given, in which case they go straight into `grid`"""
         tile_settings = tile.get_settings()
+        with gcde.profiler.phase("tile: %s" % (tile_settings["name"])):
+            tile.make(self.settings, width, height)
+        tile_obj = tile.__get_internal_obj__()
         try:
             if tile_settings["exec"][0].lower() == "settings":
                 tile_obj[0].connect("clicked", self.settings_window)
@@ -360,20 +704,48 @@ class Matrix(Gtk.Window):
         except TypeError:
             pass
         if scale:
-            self.grid.attach(tile_obj[0],
-                             gcde.common.scale(tile_obj[1], width),
-                             gcde.common.scale(tile_obj[2], height),
-                             gcde.common.scale(tile_obj[3], width),
-                             gcde.common.scale(tile_obj[4], height))
+            tile_obj = (tile_obj[0],
+                        gcde.common.scale(tile_obj[1], width),
+                        gcde.common.scale(tile_obj[2], height),
+                        gcde.common.scale(tile_obj[3], width),
+                        gcde.common.scale(tile_obj[4], height))
+        if grid is None:
+            self.view_tiles[self.building].append(tile)
+            self.__attach__(*tile_obj)
         else:
-            self.grid.attach(tile_obj[0], tile_obj[1], tile_obj[2], tile_obj[3],
-                             tile_obj[4])
+            grid.attach(tile_obj[0], tile_obj[1], tile_obj[2], tile_obj[3],
+                        tile_obj[4])
+
+    def __attach__(self, widget, x, y, w, h):
+        """Queue `widget` to go into the view being built, at X/Y/width/height
+
+        Queued widgets are attached by __layout_view__(), once the whole view
+        is known."""
+        self.pending.append((widget, x, y, w, h))
+
+    def __layout_view__(self, grid):
+        """Attach queued widgets to `grid`, on the smallest grid that fits them"""
+        if len(self.pending) == 0:
+            return
+        rects = tuple(each[1:] for each in self.pending)
+        cells = gcde.layout.compress(rects)[2]
+        for each, cell in zip(self.pending, cells):
+            grid.attach(each[0], cell[0], cell[1], cell[2], cell[3])
+        self.pending = []
 
     def autostart_settings(self, widget):
         """Window to define which files should be autostart and which shouldn't"""
-        self.clear_window()
-
-        self.make_scrolling("clicked")
+        # Toggles not written yet would be lost if the view was rebuilt
+        gcde.writeback.get_writeback().flush()
+        stamp = os.stat(home + ".config/autostart/").st_mtime_ns
+        if stamp != self.autostart_stamp:
+            self.invalidate_view("autostart")
+            self.autostart_stamp = stamp
+        self.show_view("autostart")
+
+    def __build_autostart__(self):
+        """Build the Autostart Applications view"""
+        self.__new_view__("autostart", scrolling=True)
         prefix = home + ".config/autostart/"
         w = 1
         h = 1
@@ -385,7 +757,7 @@ class Matrix(Gtk.Window):
         title.set_markup("\n\tAutostart Applications\t\n")
         title.override_font(Pango.FontDescription("Open Sans %s" % (gcde.common.scale(0.03,
                                                                                       height))))
-        self.grid.attach(title, 0, 0, 1, 2)
+        self.__attach__(title, 0, 0, 1, 2)
 
         for each in file_list:
             data = desktop_to_json(prefix + each, x, y, w, h,
@@ -394,10 +766,12 @@ class Matrix(Gtk.Window):
                 continue
             check_box = Gtk.CheckButton.new_with_label(data["name"])
             check_box.set_active(data["hidden"])
+            check_box.connect("toggled", self.__autostart_toggled__,
+                              prefix + each)
             check_box.override_font(Pango.FontDescription("Open Sans %s" % (gcde.common.scale(0.02,
                                                                                               height))))
-            self.grid.attach(check_box, data["X"], data["Y"], data["width"],
-                             data["height"])
+            self.__attach__(check_box, data["X"], data["Y"], data["width"],
+                            data["height"])
             y += 1
 
         back_button = {"exec":["settings"], "icon":"application-exit",
@@ -406,13 +780,18 @@ class Matrix(Gtk.Window):
         self.__place_tile__(back_button, scale=False)
 
         del w, h, x, y, file_list, prefix, check_box, each, data, title, back_button
-        self.show_all()
+
+    def __autostart_toggled__(self, widget, path):
+        """Enable or disable an Autostart Application"""
+        toggle_autostart(path, widget.get_active())
 
     def settings_window(self, widget):
         """Settings Window"""
-        self.clear_window()
+        self.show_view("settings")
 
-        self.make_scrolling("clicked")
+    def __build_settings__(self):
+        """Build the Settings view"""
+        self.__new_view__("settings", scrolling=True)
 
         sub_heading = 0.025
         label = 0.015
@@ -421,39 +800,41 @@ class Matrix(Gtk.Window):
         title.set_markup("\n\tSettings\t\n")
         title.override_font(Pango.FontDescription("Open Sans %s" % (gcde.common.scale(0.05,
                                                                                       height))))
-        self.grid.attach(title, 0, 0, width, 2)
+        self.__attach__(title, 0, 0, 3, 2)
 
         icon_title = Gtk.Label()
         icon_title.set_markup("\n\tIcon Size\t\n")
         icon_title.override_font(Pango.FontDescription("Open Sans %s" % (gcde.common.scale(sub_heading,
                                                                                            height))))
-        self.grid.attach(icon_title, 0, 1, width, 2)
+        self.__attach__(icon_title, 0, 1, 3, 2)
 
         self.icon_scaler = Gtk.Scale.new_with_range(Gtk.Orientation.HORIZONTAL, 4,
                                                     200, 2)
         self.icon_scaler.set_draw_value(True)
         self.icon_scaler.set_value(self.settings["icon size"])
+        self.icon_scaler.connect("button-release-event", self.__icon_size_released__)
+        self.icon_scaler.connect("key-release-event", self.__icon_size_released__)
         self.icon_scaler.override_font(Pango.FontDescription("Open Sans %s" % (gcde.common.scale(sub_heading,
                                                                                                  height))))
-        self.grid.attach(self.icon_scaler, 0, 2, width, 2)
+        self.__attach__(self.icon_scaler, 0, 2, 3, 2)
 
         menu_title = Gtk.Label()
         menu_title.set_markup("\n\tApplication Menu Tile Size\t\n")
         menu_title.override_font(Pango.FontDescription("Open Sans %s" % (gcde.common.scale(sub_heading,
                                                                                            height))))
-        self.grid.attach(menu_title, 0, 3, width, 2)
+        self.__attach__(menu_title, 0, 3, 3, 2)
 
         X_title = Gtk.Label()
         X_title.set_markup("\n\tWidth\t\n")
         X_title.override_font(Pango.FontDescription("Open Sans %s" % (gcde.common.scale(label,
                                                                                         height))))
-        self.grid.attach(X_title, 0, 4, width, 2)
+        self.__attach__(X_title, 0, 4, 3, 2)
 
         Y_title = Gtk.Label()
         Y_title.set_markup("\n\tHeight\t\n")
         Y_title.override_font(Pango.FontDescription("Open Sans %s" % (gcde.common.scale(label,
                                                                                         height))))
-        self.grid.attach(Y_title, 0, 6, width, 2)
+        self.__attach__(Y_title, 0, 6, 3, 2)
 
         self.X_scaler = Gtk.Scale.new_with_range(Gtk.Orientation.HORIZONTAL, 1,
                                                  10, 1)
@@ -461,7 +842,7 @@ class Matrix(Gtk.Window):
         self.X_scaler.set_value(self.settings["menu"]["width"])
         self.X_scaler.override_font(Pango.FontDescription("Open Sans %s" % (gcde.common.scale(sub_heading,
                                                                                               height))))
-        self.grid.attach(self.X_scaler, 0, 5, width, 2)
+        self.__attach__(self.X_scaler, 0, 5, 3, 2)
 
         self.Y_scaler = Gtk.Scale.new_with_range(Gtk.Orientation.HORIZONTAL, 1,
                                                  10, 1)
@@ -469,68 +850,63 @@ class Matrix(Gtk.Window):
         self.Y_scaler.set_value(self.settings["menu"]["height"])
         self.Y_scaler.override_font(Pango.FontDescription("Open Sans %s" % (gcde.common.scale(sub_heading,
                                                                                               height))))
-        self.grid.attach(self.Y_scaler, 0, 7, width, 2)
-
-        theming_defaults = get_theming_defaults()
-        gtk_themes = list_gtk_themes()
-        icon_themes = list_icon_themes()
+        self.__attach__(self.Y_scaler, 0, 7, 3, 2)
 
         theming_title = Gtk.Label()
         theming_title.set_markup("\n\tTheming\t\n")
         theming_title.override_font(Pango.FontDescription("Open Sans %s" % (gcde.common.scale(sub_heading,
                                                                                               height))))
-        self.grid.attach(theming_title, 0, 9, width, 2)
+        self.__attach__(theming_title, 0, 9, 3, 2)
 
         gtk_theming_title = Gtk.Label()
         gtk_theming_title.set_markup("\n\tGtk Theme\t\n")
         gtk_theming_title.override_font(Pango.FontDescription("Open Sans %s" % (gcde.common.scale(label,
                                                                                                   height))))
-        self.grid.attach(gtk_theming_title, 0, 11, width, 2)
+        self.__attach__(gtk_theming_title, 0, 11, 3, 2)
 
+        # The theme lists are filled in once the theme catalog is ready
         self.gtk_theme_chooser = Gtk.ComboBoxText.new()
-        for each in gtk_themes:
-            self.gtk_theme_chooser.append(each, each)
-        self.gtk_theme_chooser.set_active_id(theming_defaults["gtk-theme-name"])
         self.gtk_theme_chooser.override_font(Pango.FontDescription("Open Sans %s" % (gcde.common.scale(label,
                                                                                                        height))))
 
-        self.grid.attach(self.gtk_theme_chooser, 0, 13, width, 2)
+        self.__attach__(self.gtk_theme_chooser, 0, 13, 3, 2)
 
         icon_theming_title = Gtk.Label()
         icon_theming_title.set_markup("\n\tIcon Theme\t\n")
         icon_theming_title.override_font(Pango.FontDescription("Open Sans %s" % (gcde.common.scale(label,
                                                                                                    height))))
-        self.grid.attach(icon_theming_title, 0, 15, width, 2)
+        self.__attach__(icon_theming_title, 0, 15, 3, 2)
 
         self.icon_theme_chooser = Gtk.ComboBoxText.new()
-        for each in icon_themes:
-            self.icon_theme_chooser.append(each.lower(), each)
-        self.icon_theme_chooser.set_active_id(theming_defaults["gtk-icon-theme-name"])
         self.icon_theme_chooser.override_font(Pango.FontDescription("Open Sans %s" % (gcde.common.scale(label,
                                                                                                         height))))
 
-        self.grid.attach(self.icon_theme_chooser, 0, 17, width, 2)
+        self.__attach__(self.icon_theme_chooser, 0, 17, 3, 2)
+        gcde.themes.get_catalog_async(self.__fill_theme_choosers__,
+                                      self.gtk_theme_chooser,
+                                      self.icon_theme_chooser,
+                                      version=GTK_VERSION)
 
         sars = {"exec":["restart"],
                 "icon":"system-reboot",
                 "name":"Save and Restart GCDE",
                 "X":0,
                 "Y":19,
-                "width":int(width / 3),
+                "width":1,
                 "height":1}
         autolaunch = {"exec":["autostart-settings"],
                       "icon":"xfce4-session",
                       "name":"Autostart Applications",
-                      "X":int(width / 3),
+                      "X":1,
                       "Y":19,
-                      "width":int(width / 3),
+                      "width":1,
                       "height":1}
         quit = {"exec":["main"],
                 "icon":"application-exit",
                 "name":"Exit",
-                "X":int(width / 3) * 2,
+                "X":2,
                 "Y":19,
-                "width":int(width / 3),
+                "width":1,
                 "height":1}
         sars = gcde.tile.new(sars)
         quit = gcde.tile.new(quit)
@@ -539,17 +915,29 @@ class Matrix(Gtk.Window):
         self.__place_tile__(autolaunch, scale=False)
         self.__place_tile__(quit, scale=False)
 
-        del theming_defaults, gtk_themes, icon_themes, sub_heading, label
+        del sub_heading, label
 
-        self.show_all()
+    def __fill_theme_choosers__(self, catalog, gtk_chooser, icon_chooser):
+        """Fill in the theme lists in the Settings view"""
+        try:
+            theming_defaults = get_theming_defaults()
+        except FileNotFoundError:
+            theming_defaults = {}
+        for each in catalog["gtk"]:
+            gtk_chooser.append(each, each)
+        gtk_chooser.set_active_id(theming_defaults.get("gtk-theme-name"))
+        for each in catalog["icons"]:
+            icon_chooser.append(each, each)
+        icon_chooser.set_active_id(theming_defaults.get("gtk-icon-theme-name"))
+        # Only connected now, so filling in the lists doesn't change the theme
+        gtk_chooser.connect("changed", self.__theme_chosen__, "gtk-theme-name")
+        icon_chooser.connect("changed", self.__theme_chosen__,
+                             "gtk-icon-theme-name")
 
     def restart(self, widget):
-        """Restart GCDE"""
+        """Save settings, then reload GCDE with them"""
         self.save_settings("clicked")
-        try:
-            Popen(["/usr/share/gcde/restart.py"])
-        except FileNotFoundError:
-            Popen(["./restart.py"])
+        self.reload(view="main")
 
     def logout(self, widget):
         """Logout of GCDE"""
@@ -559,136 +947,310 @@ class Matrix(Gtk.Window):
         exit()
 
     def save_settings(self, widget):
-        """Save settings to file"""
-        try:
-            os.remove(local_settings)
-        except FileNotFoundError:
-            pass
-        self.settings["icon size"] = self.icon_scaler.get_value()
-        self.settings["menu"]["width"] = self.X_scaler.get_value()
-        self.settings["menu"]["height"] = self.Y_scaler.get_value()
-        with open(local_settings, "w") as file:
-            json.dump(self.settings, file, indent=1)
+        """Save settings to file
+
+        Files are only written if they changed"""
+        size = self.icon_scaler.get_value()
+        if size != self.settings["icon size"]:
+            # The slider was moved without being released, such as by
+            # scrolling over it
+            self.__apply_settings__(self.settings.replace({"icon size":size}))
+        menu = self.settings["menu"].to_dict()
+        menu["width"] = self.X_scaler.get_value()
+        menu["height"] = self.Y_scaler.get_value()
+        self.settings = self.settings.replace({"menu":menu})
+        # Only what differs from the system defaults is saved, so changes to
+        # the defaults still reach the user
+        overrides = gcde.config.get_overrides("settings", self.settings.to_dict())
+        gcde.writeback.write_if_changed(gcde.config.get_paths("settings")[1],
+                                        json.dumps(overrides, indent=1))
         with open(themes_file, "r") as file:
             data = file.read().split("\n")
         for each in range(len(data) - 1, -1, -1):
             data[each] = data[each].split("=")
+        # Theme lists which haven't been filled in yet have nothing chosen
+        gtk_theme = self.gtk_theme_chooser.get_active_id()
+        icon_theme = self.icon_theme_chooser.get_active_id()
         for each in data:
-            if each[0] == "gtk-theme-name":
-                each[1] = self.gtk_theme_chooser.get_active_id()
-            elif each[0] == "gtk-icon-theme-name":
-                each[1] = self.icon_theme_chooser.get_active_id()
+            if each[0] == "gtk-theme-name" and gtk_theme is not None:
+                each[1] = gtk_theme
+            elif each[0] == "gtk-icon-theme-name" and icon_theme is not None:
+                each[1] = icon_theme
         for each in enumerate(data):
             data[each[0]] = "=".join(data[each[0]])
         data = "\n".join(data)
-        os.remove(themes_file)
-        with open(themes_file, "w") as file:
-            file.write(data)
+        gcde.writeback.write_if_changed(themes_file, data)
 
     def menu(self, widget):
         """Application Menu"""
-        self.clear_window()
-
-        self.make_scrolling("clicked")
-
-        prefix = "/usr/share/applications/"
-        file_list = sorted(os.listdir(prefix))
-        for each in range(len(file_list) - 1, -1, -1):
-            if os.path.isdir(prefix + file_list[each]):
-                del file_list[each]
-        print(len(file_list))
+        self.__refresh_menu__()
+        self.show_view("menu")
+
+    def __refresh_menu__(self):
+        """Throw out the Menu view if installed applications have changed"""
+        if self.catalog is None:
+            self.catalog = gcde.applications.get_catalog()
+            self.catalog.connect(self.__catalog_changed__)
+        if self.catalog.version != self.menu_version:
+            self.invalidate_view("menu")
+            self.menu_applications = self.catalog.get_applications()
+            self.menu_version = self.catalog.version
+
+    def __catalog_changed__(self, catalog):
+        """Update the Menu when applications are installed or removed"""
+        if self.stack.get_visible_child_name() == "menu":
+            self.menu("clicked")
+        elif self.settings["menu"].get("prebuild", True):
+            GLib.idle_add(self.__prebuild__, "menu")
+
+    def __build_menu__(self):
+        """Build the Application Menu view"""
+        applications = self.menu_applications
+        self.menu_search_entry = Gtk.SearchEntry()
+        self.menu_search_entry.set_placeholder_text("Search Applications")
+        self.menu_search_entry.connect("search-changed", self.__search_menu__)
+        self.menu_search_entry.connect("activate", self.__search_activate__)
+        if self.settings["menu"].get("virtual", False):
+            self.__new_view__("menu", header=self.menu_search_entry)
+            self.__virtual_menu__(applications)
+            return
+
+        self.__new_view__("menu", scrolling=True,
+                          header=self.menu_search_entry)
+        self.__show_menu_entries__(range(len(applications)))
+
+        del applications
+
+    def __show_menu_entries__(self, indexes):
+        """Lay out Menu Tiles for the applications at `indexes`
+
+        Tiles are made the first time they are needed and kept after that,
+        so searching only has to move existing Tiles around."""
+        if self.menu_loader is not None:
+            GLib.source_remove(self.menu_loader)
+            self.menu_loader = None
+        grid = self.views["menu"]
+        for each in grid.get_children():
+            grid.remove(each)
+        self.menu_results = list(indexes)
+        # Place the first screenful right away, then the rest in batches while
+        # GTK is idle, so the Menu is usable before every icon is loaded
+        batch = self.settings["menu"].get("batch size", 24)
+        rows = max(1, int(height / (self.settings["icon size"] * 2)))
+        tiles = self.__menu_tiles__(self.menu_results)
+        if self.__place_tiles_batch__(tiles, 8 * rows, grid):
+            self.menu_loader = GLib.idle_add(self.__place_tiles_batch__,
+                                             tiles, batch, grid)
+
+    def __menu_tiles__(self, indexes):
+        """Generate Menu Tiles for the applications at `indexes`, laid out in rows of 8
+
+        Yields each Tile, and whether it is new"""
         w = self.settings["menu"]["width"]
         h = self.settings["menu"]["height"]
         x = 0
         y = 0
         width_max = 7
-        tiles = []
-        back = {"exec":["main"],
-                "icon":"application-exit",
-                "name":"Back to Matrix",
-                "X":x,
-                "Y":y,
-                "width":w,
-                "height":h}
-        tiles.append(gcde.tile.new(back))
-        x += 1
-        for each in file_list:
-            skip = False
-            with open(prefix + each, "r") as file:
-                data = file.read().split("\n")
-            for each1 in data:
-                if "NoDisplay" in each1:
-                    if each1[-4:].lower() == "true":
-                        skip = True
-                        break
-                elif "OnlyShowIn" in each1:
-                    if "gcde" not in each1.lower():
-                        skip = True
-                        break
-                elif "Terminal" in each1:
-                    if each1[-4:].lower() == "true":
-                        skip = True
-                        break
-                elif each1 == "":
-                    break
-            if skip:
-                continue
-            for each1 in data:
-                if each1[:5] == "Name=":
-                    name = each1[5:]
-                elif each1[:5] == "Icon=":
-                    icon = each1[5:]
-                elif each1[:5] == "Exec=":
-                    execute = shlex.split(each1[5:])
-            tile_settings = {"exec":execute,
-                             "icon":icon, "name":name,
-                             "X":x, "Y":y, "width":w, "height":h}
-            tiles.append(gcde.tile.new(tile_settings))
+        for each in itertools.chain(["back"], indexes):
+            tile = self.menu_tiles.get(each)
+            if tile is not None:
+                tile.change_setting("X", x)
+                tile.change_setting("Y", y)
+            elif each == "back":
+                tile = gcde.tile.new({"exec":["main"],
+                                      "icon":"application-exit",
+                                      "name":"Back to Matrix",
+                                      "X":x, "Y":y, "width":w, "height":h})
+            else:
+                app = self.menu_applications[each]
+                tile = gcde.tile.new({"exec":app["exec"], "icon":app["icon"],
+                                      "name":app["name"], "X":x, "Y":y,
+                                      "width":w, "height":h,
+                                      "field codes":True})
+            new = each not in self.menu_tiles
+            # Recorded before yielding, since the loader may be cancelled
+            # while paused here, and the Tile would be made again
+            self.menu_tiles[each] = tile
+            yield (tile, new)
             if x >= width_max:
                 x = 0
                 y += 1
             else:
                 x += 1
-        for each in tiles:
-            self.__place_tile__(each, scale=False)
-        # Try to free some memeory
-        del tiles, file_list, each, each1, tile_settings, back, x, y, width_max
-        del w, h, prefix, execute, icon, name, data
 
-        self.show_all()
+    def __search_menu__(self, entry):
+        """Narrow the Menu down to applications matching the search"""
+        if self.menu_search is None:
+            self.__index_menu__()
+        results = self.menu_search.search(entry.get_text())
+        if self.menu_pool is None:
+            self.__show_menu_entries__(results)
+            return
+        self.menu_results = results
+        self.menu_entries = [self.menu_entries[0]] + [self.menu_applications[each]
+                                                      for each in results]
+        adjustment = self.menu_adjustment
+        adjustment.set_upper(max(-(-len(self.menu_entries) // 8),
+                                 adjustment.get_page_size()))
+        # The entries changed, so the Tiles need re-binding even if the
+        # Menu was already scrolled to the top
+        self.menu_start = None
+        adjustment.set_value(0)
+        self.__scroll_menu__(adjustment)
+
+    def __search_activate__(self, entry):
+        """Launch the best match for the search"""
+        if not self.menu_results:
+            return
+        if self.menu_pool is None:
+            self.menu_tiles[self.menu_results[0]].run(entry)
+        else:
+            self.menu_pool[1].run(entry)
 
-    def clear_window(self):
-        """Clear Window"""
-        children = self.grid.get_children()
-        for each in children:
-            self.grid.remove(each)
-        if self.scrolling:
-            self.scrolled_window.remove(self.grid)
-            self.remove(self.scrolled_window)
-            self.add(self.grid)
-            self.scrolling = False
-
-
-def list_icon_themes():
-    """List Icon Themes"""
-    themes = os.listdir("/usr/share/icons")
-    for each in range(len(themes) - 1, -1, -1):
-        if "default" in themes[each].lower():
-            del themes[each]
-    return themes
-
-
-def list_gtk_themes(version=GTK_VERSION):
-    """List GTK themes for a specific version"""
-    themes_dir = "/usr/share/themes/"
-    themes = os.listdir(themes_dir)
-    for each in range(len(themes) - 1, -1, -1):
-        sub = os.listdir(themes_dir + themes[each])
-        if ("gtk-" + version) not in sub:
-            del themes[each]
-        elif "default" in themes[each].lower():
-            del themes[each]
-    return themes
+    def __index_menu__(self):
+        """Build the search index for the Menu
+
+        Also used as a GLib idle callback"""
+        if self.menu_search is None:
+            self.menu_search = gcde.search.SearchIndex(self.menu_applications)
+        return False
+
+    def __virtual_menu__(self, applications):
+        """Virtualized Application Menu
+
+        Only enough Tiles to fill the screen are made. Scrolling re-binds
+        those Tiles to other applications, instead of scrolling a grid holding
+        a Tile for every application."""
+        columns = 8
+        rows = max(1, int(height / (self.settings["icon size"] * 2)))
+        w = self.settings["menu"]["width"]
+        h = self.settings["menu"]["height"]
+        back = {"exec":["main"],
+                "icon":"application-exit",
+                "name":"Back to Matrix"}
+        self.menu_entries = [back] + applications
+        self.menu_results = list(range(len(applications)))
+        total_rows = -(-len(self.menu_entries) // columns)
+        self.menu_adjustment = Gtk.Adjustment(value=0, lower=0,
+                                              upper=max(total_rows, rows),
+                                              step_increment=1,
+                                              page_increment=rows,
+                                              page_size=rows)
+        self.menu_adjustment.connect("value-changed", self.__scroll_menu__)
+        self.menu_pool = []
+        for y in range(rows):
+            for x in range(columns):
+                tile = gcde.tile.new({"exec":[], "icon":"", "name":"",
+                                      "X":x, "Y":y, "width":w, "height":h,
+                                      "field codes":True})
+                tile_obj = tile.__get_internal_obj__()
+                tile_obj[0].connect("clicked", self.__menu_tile_clicked__,
+                                    tile)
+                self.grid.attach(tile_obj[0], tile_obj[1], tile_obj[2],
+                                 tile_obj[3], tile_obj[4])
+                self.menu_pool.append(tile)
+
+        del columns, rows, w, h, back, total_rows
+
+    def __scroll_menu__(self, adjustment):
+        """Re-bind the virtualized Menu's Tiles to the rows now in view
+
+        Smooth scrolling moves by fractions of a row, so nothing is done
+        unless the first row in view changed."""
+        start = int(adjustment.get_value()) * 8
+        if start == self.menu_start:
+            return
+        self.menu_start = start
+        for each in enumerate(self.menu_pool):
+            index = start + each[0]
+            tile_obj = each[1].__get_internal_obj__()[0]
+            if index >= len(self.menu_entries):
+                tile_obj.hide()
+                continue
+            each[1].rebind(self.menu_entries[index])
+            each[1].make(self.settings, width, height)
+            tile_obj.show()
+
+    def __menu_tile_clicked__(self, widget, tile):
+        """Handle clicks on virtualized Menu Tiles"""
+        if tile.get_settings()["exec"][0] == "main":
+            self.tile(widget)
+        else:
+            tile.run(widget)
+
+    def __menu_event__(self, widget, event):
+        """Handle typing to search, and scrolling the virtualized Menu"""
+        if self.stack.get_visible_child_name() != "menu":
+            return False
+        # Typing anywhere in the Menu starts a search. Only keys which type
+        # something are passed on, otherwise Return (or "enter" on a
+        # controller) would activate the search as well as the focused Tile
+        if ((event.type == Gdk.EventType.KEY_PRESS) and
+                (self.get_focus() is not self.menu_search_entry) and
+                (event.keyval not in (Gdk.KEY_Return, Gdk.KEY_KP_Enter,
+                                      Gdk.KEY_ISO_Enter, Gdk.KEY_Escape))):
+            char = chr(Gdk.keyval_to_unicode(event.keyval))
+            if (char.isprintable() and not char.isspace() and
+                    self.menu_search_entry.handle_event(event)):
+                self.menu_search_entry.grab_focus_without_selecting()
+                return True
+        if self.menu_pool is None:
+            return False
+        adjustment = self.menu_adjustment
+        if event.type == Gdk.EventType.SCROLL:
+            if event.direction == Gdk.ScrollDirection.SMOOTH:
+                step = event.get_scroll_deltas()[2]
+            elif event.direction == Gdk.ScrollDirection.UP:
+                step = -1
+            elif event.direction == Gdk.ScrollDirection.DOWN:
+                step = 1
+            else:
+                return False
+            adjustment.set_value(adjustment.get_value() + step)
+            return True
+        # Moving focus past the first or last row scrolls by a row, keeping
+        # focus on the same (now re-bound) Tile
+        focus = [each.__get_internal_obj__()[0] for each in self.menu_pool]
+        try:
+            row = focus.index(self.get_focus()) // 8
+        except ValueError:
+            return False
+        last_row = (len(self.menu_pool) // 8) - 1
+        if event.keyval == Gdk.KEY_Down and row == last_row:
+            step = 1
+        elif event.keyval == Gdk.KEY_Up and row == 0:
+            step = -1
+        elif event.keyval == Gdk.KEY_Page_Down:
+            step = adjustment.get_page_increment()
+        elif event.keyval == Gdk.KEY_Page_Up:
+            step = -adjustment.get_page_increment()
+        else:
+            return False
+        value = adjustment.get_value()
+        adjustment.set_value(value + step)
+        return adjustment.get_value() != value
+
+    def __place_tiles_batch__(self, tiles, count, grid):
+        """Place up to `count` Tiles from `tiles` into `grid`
+
+        `tiles` yields each Tile, and whether it is new. Tiles which aren't
+        new have already been set up, and only need to be put back in the
+        grid. Used as a GLib idle callback. Returns True while there are
+        Tiles left to place."""
+        placed = 0
+        for tile, new in itertools.islice(tiles, count):
+            if new:
+                self.__place_tile__(tile, scale=False, grid=grid)
+            else:
+                tile_obj = tile.__get_internal_obj__()
+                grid.attach(tile_obj[0], tile_obj[1], tile_obj[2],
+                            tile_obj[3], tile_obj[4])
+            tile.__get_internal_obj__()[0].show_all()
+            placed += 1
+        if placed < count:
+            self.menu_loader = None
+            return False
+        return True
 
 
 def get_theming_defaults():
@@ -711,11 +1273,18 @@ def get_theming_defaults():
 
 def main():
     """Set up the Matrix desktop wide, make it transparent"""
-    matrix = Matrix()
-    matrix.tile("clicked")
+    with gcde.profiler.phase("matrix"):
+        matrix = Matrix()
+    # `kill -HUP` (or restart.py --reload) reloads GCDE, without restarting it
+    GLib.unix_signal_add(GLib.PRIORITY_DEFAULT, signal.SIGHUP, matrix.__sighup__)
+    GLib.unix_signal_add(GLib.PRIORITY_DEFAULT, signal.SIGTERM, matrix.__sigterm__)
+    gcde.common.write_pidfile()
+    atexit.register(gcde.common.remove_pidfile)
+    with gcde.profiler.phase("main view"):
+        matrix.tile("clicked")
     matrix.set_decorated(False)
     matrix.set_resizable(False)
-    matrix.move(0, 0)
+    matrix.move(origin[0], origin[1])
     matrix.set_size_request(width, height)
     matrix.set_keep_below(True)
     matrix.show_all()
@@ -56,6 +56,10 @@ import gcde
 # number to run() so that you can determine which thread does what.
 PLUGIN_TYPE = 0
 
+# TILE_SIZE is optional. If the user hasn't placed this plugin in tiles.json,
+# GCDE will give it the first free slot in the Matrix of this size (width, height).
+TILE_SIZE = (1, 1)
+
 # This could be named run(), but just in case we avoided naming it that
 # GCDE will know this is a Foreground Plugin, and thus will expect to get a modified
 # Tile back, that's it
@@ -76,14 +80,15 @@ def plugin_setup(settings):
     """Setup plugin for GCDE"""
     # You can start by simply defining a Tile
     # Do NOT hard-code your plugin's location in the Matrix
-    # This could overwrite a pre-existing Tile
+    # This could overwrite a pre-existing Tile. Use the location GCDE gives you,
+    # either from tiles.json, or a free slot picked using TILE_SIZE.
     # The `settings` variable contains either location settings, or global settings,
     # or both. If both, location settings will be under settings["loc"]
     # global settings will be under settings["global"]
     #
-    # Settings are passed to plugin_setup() by value, not by reference. So, attempting
-    # to edit global settings from within a plugin will not affect a running GCDE
-    # instance.
+    # Location settings are a copy, which you may change freely. Global settings are
+    # a read-only snapshot shared with the rest of GCDE, so attempting to edit them
+    # raises TypeError. Use settings.to_dict() if you need an editable copy.
     #
     # If you plan to overwrite Tile.run(), leave "exec" blank, but it still must be defined.
     updater_settings = {"exec":[""],